@@ -1,11 +1,94 @@
+import hashlib
+import io
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 
+from estoque import acuracia, armazenamento, diagnostico, graficos, historico, ingestao, motor, rede, sensibilidade, simulacao, tabela
+
 st.set_page_config(page_title="Análise de Previsão e Estoque", layout="wide")
 
 
+# --- ETAPAS MEMOIZADAS ---
+# Cada etapa é chaveada pelo hash do arquivo e apenas pelos parâmetros de que depende.
+# Argumentos com "_" não entram na chave do cache: são determinados pelos demais.
+@st.cache_data(show_spinner=False)
+def carregar_dados(hash_arquivo, _conteudo, formato_historico=False, dias_no_periodo=None, janela_dias=None):
+    if formato_historico:
+        return historico.ler_historico(io.BytesIO(_conteudo), dias_no_periodo, janela_dias=janela_dias)
+    return motor.ler_csv(io.BytesIO(_conteudo))
+
+
+@st.cache_data(show_spinner=False)
+def etapa_acuracia(chave_dados, _df):
+    # Acurácia e Curva ABC do catálogo completo independem dos parâmetros e da seleção
+    df_catalogo, _ = motor.garantir_estoque(_df)
+    return motor.calcular_acuracia(df_catalogo)
+
+
+@st.cache_data(show_spinner=False)
+def etapa_abc(chave_dados, _df_acuracia):
+    return motor.calcular_curva_abc(_df_acuracia)
+
+
+@st.cache_data(show_spinner=False)
+def etapa_pedido(chave_dados, _df_catalogo, custo_pedido, custo_manutencao_percentual,
+                 moq_fornecedor, lote_multiplo, periodos_no_ano):
+    return motor.calcular_pedido(_df_catalogo, custo_pedido, custo_manutencao_percentual,
+                                 moq_fornecedor, lote_multiplo, periodos_no_ano)
+
+
+@st.cache_data(show_spinner=False)
+def etapa_ponto_pedido(chave_dados, _df_catalogo, z_score, dias_no_periodo):
+    return motor.calcular_ponto_pedido(_df_catalogo, z_score, dias_no_periodo)
+
+
+@st.cache_resource(show_spinner=False)
+def abrir_armazem():
+    # Compartilhado entre sessões; sem pasta gravável, o app segue apenas com o cache em memória
+    try:
+        return armazenamento.ArmazemResultados()
+    except OSError:
+        return None
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def montar_acuracia(hash_arquivo, formato_historico, frequencia, _conteudo, _df):
+    # Somente leitura depois de montado, por isso pode ser compartilhado como o armazém.
+    # Sem histórico, o próprio arquivo é o único período.
+    if formato_historico:
+        return acuracia.ler_historico(io.BytesIO(_conteudo), frequencia)
+    motor_acuracia = acuracia.AcuraciaIncremental(ingestao.chaves(_df.columns))
+    motor_acuracia.adicionar_periodo('Atual', _df)
+    return motor_acuracia
+
+
+@st.cache_data(show_spinner=False)
+def etapa_acuracia_periodos(chave_acuracia, mascara, janela, _motor_acuracia, _df):
+    return (_motor_acuracia.por_grupo(_df, 'Curva_ABC'),
+            _motor_acuracia.por_janela(_df, janela, 'Curva_ABC'),
+            _motor_acuracia.por_produto(janela, _df, ['Curva_ABC']))
+
+
+@st.cache_data(show_spinner=False)
+def etapa_rede(chave_dados, parametros_estoque, mascara, _df):
+    # Consolidações da seleção atual; a máscara entra na chave para que filtros diferentes não colidam
+    return rede.consolidar_por_produto(_df), rede.consolidar_por_local(_df)
+
+
+@st.cache_data(show_spinner=False)
+def etapa_sensibilidade(chave_dados, parametros_estoque, mascara, niveis_servico, custos_manutencao, custos_pedido, _df):
+    return sensibilidade.varrer_parametros(_df, niveis_servico, custos_manutencao, custos_pedido, moq_fornecedor,
+                                           lote_multiplo, periodos_no_ano, dias_no_periodo)
+
+
+@st.cache_data(show_spinner=False)
+def etapa_simulacao(chave_dados, parametros_estoque, meta_servico, tipo_meta, n_simulacoes, _df):
+    return simulacao.simular_nivel_servico(_df, meta_servico, tipo_meta, n_simulacoes, semente=0)
+
+
 # --- SIDEBAR PARA INPUTS DE GESTÃO DE ESTOQUE ---
 st.sidebar.header("⚙️ Parâmetros de Gestão de Estoque")
 
@@ -29,13 +112,13 @@ moq_fornecedor = st.sidebar.number_input(
     "MOQ do Fornecedor (unidades)",
     min_value=0,
     value=1,
-    help="Quantidade Mínima de Compra (MOQ) exigida pelo fornecedor."
+    help="Quantidade Mínima de Compra (MOQ) exigida pelo fornecedor. Usada para os produtos sem a coluna 'moq' no CSV."
 )
 lote_multiplo = st.sidebar.number_input(
     "Lote Múltiplo de Compra (unidades)",
     min_value=1,
     value=1,
-    help="O pedido deve ser um múltiplo deste valor (ex: caixas com 12 unidades)."
+    help="O pedido deve ser um múltiplo deste valor (ex: caixas com 12 unidades). Usado para os produtos sem a coluna 'lote_multiplo' no CSV."
 )
 periodos_no_ano = st.sidebar.number_input(
     "Períodos no Ano",
@@ -72,9 +155,41 @@ meta_otif = st.sidebar.slider(
 )
 
 
+# Resultados salvos em disco
+armazem = abrir_armazem()
+painel_armazem = st.sidebar.expander("💾 Resultados Salvos")
+with painel_armazem:
+    usar_snapshots = st.checkbox(
+        "Reutilizar resultados salvos",
+        value=armazem is not None,
+        disabled=armazem is None,
+        help="Guarda o catálogo lido de cada arquivo e as análises salvas com o botão \"Salvar esta análise\". "
+             "Reabrir o mesmo arquivo carrega do disco."
+    )
+    if armazem is not None:
+        if st.button("Limpar resultados salvos"):
+            armazem.limpar()
+        st.caption(f"{len(armazem.snapshots())} análises salvas, {armazem.tamanho_total() / 1024 ** 2:,.1f} MB "
+                   f"de {armazem.limite_bytes / 1024 ** 2:,.0f} MB. As menos usadas são removidas primeiro.")
+    else:
+        st.caption("Armazenamento indisponível neste servidor.")
+
+
+# Diagnóstico de desempenho
+painel_diagnostico = st.sidebar.expander("🩺 Diagnóstico")
+with painel_diagnostico:
+    exibir_diagnostico = st.checkbox(
+        "Exibir tempos por etapa",
+        value=False,
+        help="Mostra o tempo e a variação de memória de cada etapa nesta execução. Os mesmos dados são registrados em log (JSON)."
+    )
+
+diagnostico.configurar_log()
+diag = diagnostico.Diagnostico()
+
+
 # Mapeamento do Nível de Serviço para o Z-score
-z_scores = {90: 1.28, 95: 1.65, 98: 2.05, 99: 2.33}
-z_score = z_scores[nivel_servico_z]
+z_score = motor.Z_SCORES[nivel_servico_z]
 
 
 # --- TÍTULO PRINCIPAL ---
@@ -94,6 +209,8 @@ with st.expander("🧮 Fórmulas Utilizadas (Versão Aprimorada)"):
     - **Pedido Recomendado**:
       1. Ajuste para MOQ: `max(LEC, MOQ)`
       2. Ajuste para Lote Múltiplo: `ceil(Ajuste_MOQ / Lote_Multiplo) * Lote_Multiplo`
+      
+      *MOQ e Lote Múltiplo vêm das colunas `moq` e `lote_multiplo` do CSV quando existirem; caso contrário, dos valores da barra lateral.*
 
     ---
     ### Ponto de Pedido e Estoque de Segurança
@@ -109,148 +226,221 @@ with st.expander("🧮 Fórmulas Utilizadas (Versão Aprimorada)"):
       
     - **Ponto de Pedido (ROP)**:
       \\[ ROP = (\\text{Demanda Média Diária} \\times LT) + SS \\]
+
+    ---
+    ### Vários Locais
+    Com a coluna `local` (ou `deposito`), LEC, SS, ROP e status são calculados por **produto e local**. Na visão da rede, o SS agrupado supõe um estoque único para a demanda de todos os locais:
+      \\[ SS_{agrupado} = \\sqrt{\\sum_i SS_i^2} \\]
+
+    ---
+    ### Histórico Diário
+    Com o histórico diário, **μd** e **σd** são calculados por produto sobre os dias entre a primeira venda (ou o início da janela) e a última data do arquivo (dias sem registro contam como zero).
+    **LT** e **σLT** vêm de `lead_time_observado` quando informado; produtos sem lead time usam a média dos demais produtos do local. `real` e `previsto` passam a ser a média por período (média diária × dias no período).
     """)
 
-# Upload CSV
-uploaded_file = st.file_uploader(
-    "📁 Envie um arquivo CSV com as colunas: 'produto', 'real', 'previsto', 'valor_unitario', 'lead_time_dias'.\n\n"
-    "**Opcionais para mais precisão:** 'estoque', 'desvio_padrao_demanda_diaria', 'desvio_padrao_lead_time'.",
-    type=["csv"]
+# Formato do CSV
+formato_csv = st.radio(
+    "Formato do arquivo",
+    options=["Uma linha por produto", "Histórico diário por produto"],
+    horizontal=True,
+    help="No histórico diário, a demanda média e os desvios padrão são calculados a partir das vendas de cada dia."
 )
+formato_historico = formato_csv == "Histórico diário por produto"
+
+# Upload CSV
+if formato_historico:
+    janela_dias = st.number_input(
+        "Janela de histórico (dias)",
+        min_value=0,
+        value=0,
+        help="Considera apenas os últimos N dias do histórico. Use 0 para todo o período."
+    )
+    uploaded_file = st.file_uploader(
+        "📁 Envie um arquivo CSV com as colunas: 'produto', 'data', 'real', 'previsto', 'valor_unitario' e 'lead_time_dias' (ou 'lead_time_observado').\n\n"
+        "**Opcionais:** 'lead_time_observado' (lead time de cada recebimento), 'estoque', 'moq', 'lote_multiplo', 'local'.",
+        type=["csv"]
+    )
+else:
+    janela_dias = None
+    uploaded_file = st.file_uploader(
+        "📁 Envie um arquivo CSV com as colunas: 'produto', 'real', 'previsto', 'valor_unitario', 'lead_time_dias'.\n\n"
+        "**Opcionais para mais precisão:** 'estoque', 'desvio_padrao_demanda_diaria', 'desvio_padrao_lead_time', 'moq', 'lote_multiplo'.\n\n"
+        "**Vários locais:** inclua a coluna 'local' (ou 'deposito') para calcular por produto e local e consolidar a rede.",
+        type=["csv"]
+    )
 
 if uploaded_file:
     try:
-        df = pd.read_csv(uploaded_file)
-
-        # Verificar colunas obrigatórias
-        required_cols = {'produto', 'real', 'previsto', 'valor_unitario', 'lead_time_dias'}
-        if not required_cols.issubset(df.columns):
-            missing_cols = required_cols - set(df.columns)
+        with diag.etapa('hash_arquivo'):
+            conteudo = uploaded_file.getvalue()
+            hash_arquivo = hashlib.sha256(conteudo).hexdigest()
+        diag.contexto.update(arquivo=hash_arquivo[:12], tamanho_mb=round(len(conteudo) / 1024 ** 2, 2))
+
+        # Os dados carregados dependem também do formato e, no histórico, dos parâmetros de agregação
+        dias_historico = dias_no_periodo if formato_historico else None
+        janela_historico = (janela_dias or None) if formato_historico else None
+        chave_dados = (hash_arquivo, formato_historico, dias_historico, janela_historico)
+
+        parametros_estoque = (custo_pedido, custo_manutencao_percentual, moq_fornecedor, lote_multiplo,
+                              periodos_no_ano, dias_no_periodo, z_score)
+        chave_resultado = armazenamento.chave_snapshot(chave_dados, parametros_estoque)
+        chave_catalogo = armazenamento.chave_snapshot(chave_dados)
+
+        # Análise salva para este arquivo e estes parâmetros ou, sem ela, o catálogo já lido do arquivo
+        # (ingestão, acurácia e Curva ABC), que não depende da barra lateral (nesta ou em outra sessão)
+        snapshot = catalogo = None
+        if armazem is not None and usar_snapshots:
+            with diag.etapa('snapshot_leitura'):
+                snapshot = armazem.carregar(chave_resultado)
+                if snapshot is None:
+                    catalogo = armazem.carregar(chave_catalogo)
+
+        missing_cols = set()
+        if snapshot is not None:
+            df_completo, metadados_snapshot = snapshot
+            tinha_estoque = metadados_snapshot.get('tinha_estoque', True)
+            diag.contexto['produtos'] = len(df_completo)
+            st.caption("💾 Análise salva carregada do armazenamento local.")
+        else:
+            if catalogo is not None:
+                df_catalogo, metadados_catalogo = catalogo
+                tinha_estoque = metadados_catalogo.get('tinha_estoque', True)
+                diag.contexto['produtos'] = len(df_catalogo)
+                st.caption("💾 Catálogo carregado do armazenamento local.")
+            else:
+                # Verificar colunas obrigatórias (validadas bloco a bloco durante a leitura)
+                try:
+                    with diag.etapa('ingestao') as info:
+                        df = carregar_dados(hash_arquivo, conteudo, formato_historico, dias_historico, janela_historico)
+                        info['linhas'] = len(df)
+                    diag.contexto['produtos'] = len(df)
+                except ingestao.ColunasFaltantesError as erro:
+                    missing_cols = erro.colunas
+
+                if not missing_cols:
+                    # --- CÁLCULOS POR PRODUTO (catálogo completo, independem dos parâmetros) ---
+                    with diag.etapa('acuracia'):
+                        df_acuracia = etapa_acuracia(chave_dados, df)
+                    with diag.etapa('curva_abc'):
+                        df_catalogo = etapa_abc(chave_dados, df_acuracia)
+                    tinha_estoque = 'estoque' in df.columns
+
+                    # Gravado uma vez por arquivo: mudar os parâmetros não gera novos snapshots
+                    if armazem is not None and usar_snapshots:
+                        with diag.etapa('snapshot_gravacao'):
+                            armazem.salvar(chave_catalogo, df_catalogo, {'tinha_estoque': tinha_estoque})
+
+            if not missing_cols:
+                # --- CÁLCULOS DE GESTÃO DE ESTOQUE ---
+                with diag.etapa('lec_pedido'):
+                    df_pedido = etapa_pedido(chave_dados, df_catalogo, custo_pedido, custo_manutencao_percentual,
+                                             moq_fornecedor, lote_multiplo, periodos_no_ano)
+                with diag.etapa('estoque_seguranca_rop'):
+                    df_rop = etapa_ponto_pedido(chave_dados, df_catalogo, z_score, dias_no_periodo)
+
+                with diag.etapa('consolidacao'):
+                    df_completo = pd.concat([df_catalogo, df_pedido, df_rop], axis=1)
+
+                # A tabela completa (até Status_Estoque) só é gravada quando o analista pede
+                if armazem is not None and usar_snapshots:
+                    with painel_armazem:
+                        if st.button("Salvar esta análise", help="Grava a tabela calculada com os parâmetros atuais."):
+                            with diag.etapa('snapshot_gravacao'):
+                                armazem.salvar(chave_resultado, df_completo, {'tinha_estoque': tinha_estoque})
+                            st.caption("Análise salva.")
+
+        if missing_cols:
             st.error(f"❌ O arquivo deve conter as colunas: {', '.join(missing_cols)}.")
         else:
-            lista_produtos = df['produto'].unique().tolist()
-            produtos_selecionados = st.multiselect(
-                "**Selecione os produtos para análise:**",
-                options=lista_produtos,
-                default=lista_produtos,
-                help="Selecione um ou mais produtos para recalcular os indicadores e gráficos."
-            )
-            
-            if not produtos_selecionados:
-                st.warning("⚠️ Por favor, selecione ao menos um produto para visualizar a análise.")
+            # --- VERIFICAÇÃO DE COLUNAS OPCIONAIS ---
+            if not tinha_estoque:
+                st.info("Coluna 'estoque' não encontrada. O status de ressuprimento não será calculado.")
+
+            formula_ss = motor.formula_estoque_seguranca(df_completo.columns)
+            if formula_ss == 'avancada':
+                st.success("Detectadas colunas de desvio padrão da demanda e do lead time. Usando a fórmula avançada para Estoque de Segurança.")
+            elif formula_ss == 'padrao':
+                st.info("Detectada coluna de desvio padrão da demanda. Usando a fórmula refinada para Estoque de Segurança.")
             else:
-                df_filtrado = df[df['produto'].isin(produtos_selecionados)].copy()
-
-                # --- CÁLCULOS DE ACURÁCIA ---
-                df_filtrado['erro_absoluto'] = abs(df_filtrado['real'] - df_filtrado['previsto'])
-                df_filtrado['bias_individual'] = df_filtrado['previsto'] - df_filtrado['real']
-                df_filtrado['prejuizo'] = df_filtrado['erro_absoluto'] * df_filtrado['valor_unitario']
-
-                # --- CÁLCULO DA CURVA ABC ---
-                df_filtrado['valor_consumo'] = df_filtrado['real'] * df_filtrado['valor_unitario']
-                df_filtrado = df_filtrado.sort_values(by='valor_consumo', ascending=False)
-                df_filtrado['valor_acumulado'] = df_filtrado['valor_consumo'].cumsum()
-                valor_total_consumo = df_filtrado['valor_consumo'].sum()
-                df_filtrado['percentual_acumulado'] = (df_filtrado['valor_acumulado'] / valor_total_consumo) * 100
-
-                def classificar_abc(percentual):
-                    if percentual <= 80: return 'A'
-                    elif 80 < percentual <= 95: return 'B'
-                    else: return 'C'
-                df_filtrado['Curva_ABC'] = df_filtrado['percentual_acumulado'].apply(classificar_abc)
-                
-                # --- VERIFICAÇÃO DE COLUNAS OPCIONAIS ---
-                if 'estoque' not in df_filtrado.columns:
-                    df_filtrado['estoque'] = 0 # Define como 0 se não existir
-                    st.info("Coluna 'estoque' não encontrada. O status de ressuprimento não será calculado.")
+                st.warning("Nenhuma coluna de desvio padrão encontrada. O Estoque de Segurança será calculado de forma simplificada (menos precisa).")
 
-                # --- CÁLCULOS DE GESTÃO DE ESTOQUE ---
-                # Demanda Média Diária
-                df_filtrado['demanda_diaria_media'] = df_filtrado['real'] / dias_no_periodo
-
-                # Lote Econômico (LEC/EOQ)
-                df_filtrado['demanda_anual'] = df_filtrado['real'] * periodos_no_ano
-                df_filtrado['custo_manutencao_unidade'] = df_filtrado['valor_unitario'] * (custo_manutencao_percentual / 100)
-                if custo_manutencao_percentual > 0:
-                    numerador = 2 * df_filtrado['demanda_anual'] * custo_pedido
-                    denominador = df_filtrado['custo_manutencao_unidade']
-                    # Evitar divisão por zero ou raiz de número negativo
-                    df_filtrado['LEC_EOQ'] = np.sqrt(numerador / denominador.replace(0, np.nan)).fillna(0).round(0)
-                else:
-                    df_filtrado['LEC_EOQ'] = np.inf
+            multi_local = rede.tem_locais(df_completo)
 
-                # Pedido Recomendado (Ajustado para MOQ e Lote Múltiplo)
-                df_filtrado['Pedido_Ajustado_MOQ'] = df_filtrado[['LEC_EOQ', 'produto']].apply(
-                    lambda row: max(row['LEC_EOQ'], moq_fornecedor), axis=1
+            # --- SELEÇÃO DE PRODUTOS ---
+            st.markdown("**Filtre os produtos para análise:**")
+            col_f1, col_f2, col_f3 = st.columns(3)
+            with col_f1:
+                classes_selecionadas = st.multiselect(
+                    "Curva ABC (catálogo completo)", options=['A', 'B', 'C'], default=[],
+                    help="Classe de cada produto considerando todo o catálogo. Vazio = todas."
+                )
+            with col_f2:
+                status_selecionados = st.multiselect(
+                    "Status de Estoque", options=motor.STATUS_ESTOQUE, default=[],
+                    help="Vazio = todos."
+                )
+            with col_f3:
+                prefixo_produto = st.text_input("Produto começa com", value="", help="Filtra pelo início do nome ou código do produto.")
+            locais_selecionados = []
+            if multi_local:
+                locais_selecionados = st.multiselect(
+                    "Locais", options=list(df_completo['local'].cat.categories), default=[],
+                    help="Restringe a análise a alguns locais. Vazio = toda a rede."
                 )
-                df_filtrado['Pedido_Recomendado'] = np.ceil(df_filtrado['Pedido_Ajustado_MOQ'] / lote_multiplo) * lote_multiplo
-
-                # Estoque de Segurança (SS) - Lógica aprimorada
-                if 'desvio_padrao_demanda_diaria' in df_filtrado.columns and 'desvio_padrao_lead_time' in df_filtrado.columns:
-                    st.success("Detectadas colunas de desvio padrão da demanda e do lead time. Usando a fórmula avançada para Estoque de Segurança.")
-                    # Fórmula completa
-                    variancia_demanda = df_filtrado['lead_time_dias'] * (df_filtrado['desvio_padrao_demanda_diaria'] ** 2)
-                    variancia_lead_time = (df_filtrado['demanda_diaria_media'] ** 2) * (df_filtrado['desvio_padrao_lead_time'] ** 2)
-                    df_filtrado['estoque_seguranca'] = z_score * np.sqrt(variancia_demanda + variancia_lead_time)
-                elif 'desvio_padrao_demanda_diaria' in df_filtrado.columns:
-                    st.info("Detectada coluna de desvio padrão da demanda. Usando a fórmula refinada para Estoque de Segurança.")
-                    # Fórmula com variabilidade da demanda
-                    df_filtrado['estoque_seguranca'] = z_score * df_filtrado['desvio_padrao_demanda_diaria'] * np.sqrt(df_filtrado['lead_time_dias'])
-                else:
-                    st.warning("Nenhuma coluna de desvio padrão encontrada. O Estoque de Segurança será calculado de forma simplificada (menos precisa).")
-                    # Fórmula original (menos precisa) como fallback
-                    df_filtrado['estoque_seguranca'] = z_score * df_filtrado['demanda_diaria_media'] * np.sqrt(df_filtrado['lead_time_dias'])
-
-                # Ponto de Pedido (ROP)
-                df_filtrado['Ponto_de_Pedido'] = (df_filtrado['demanda_diaria_media'] * df_filtrado['lead_time_dias']) + df_filtrado['estoque_seguranca']
-                df_filtrado['Ponto_de_Pedido'] = df_filtrado['Ponto_de_Pedido'].round(0)
 
-                # Alerta de Ressuprimento
-                df_filtrado['Status_Estoque'] = np.where(df_filtrado['estoque'] <= df_filtrado['Ponto_de_Pedido'], 'PEDIR AGORA!', 'OK')
+            with diag.etapa('selecao'):
+                mascara = motor.mascara_selecao(df_completo, classes_selecionadas, status_selecionados,
+                                                prefixo_produto.strip(), locais_selecionados)
 
+            if not mascara.any():
+                st.warning("⚠️ Nenhum produto corresponde aos filtros selecionados.")
+            else:
+                with diag.etapa('curva_abc_selecao') as info:
+                    # A seleção preserva a ordem por consumo, então a Curva ABC da seleção é só um cumsum
+                    df_filtrado = df_completo if mascara.all() else df_completo[mascara]
+                    df_filtrado = motor.classificar_curva_abc(df_filtrado)
+                    info['linhas'] = len(df_filtrado)
+                unidade = "pares produto/local" if multi_local else "produtos"
+                st.caption(f"{len(df_filtrado):,} de {len(df_completo):,} {unidade} selecionados.")
 
                 # --- MÉTRICAS GERAIS ---
-                soma_erro = df_filtrado['erro_absoluto'].sum()
-                soma_real = df_filtrado['real'].abs().sum()
-                wmape = (soma_erro / soma_real) * 100 if soma_real != 0 else 0
-                fa = 100 - wmape
-                bias_total = df_filtrado['bias_individual'].sum()
-                mad = np.mean(df_filtrado['erro_absoluto'])
-
-                # Cálculo do Giro de Estoque
-                valor_vendas_total = (df_filtrado['real'] * df_filtrado['valor_unitario']).sum()
-                valor_estoque_total = (df_filtrado['estoque'] * df_filtrado['valor_unitario']).sum()
-                giro_estoque = valor_vendas_total / valor_estoque_total if valor_estoque_total > 0 else 0
+                with diag.etapa('indicadores'):
+                    indicadores = motor.calcular_indicadores(df_filtrado)
+                wmape = indicadores['wmape']
+                fa = indicadores['fa']
+                bias_total = indicadores['bias_total']
+                mad = indicadores['mad']
+                giro_estoque = indicadores['giro_estoque']
 
-                
-                
-                
                   # SEÇÃO DE DESTAQUES
                 st.markdown("---")
                 st.subheader("🔍 Destaques da Análise")
-                maior_erro_prod = df_filtrado.loc[df_filtrado['erro_absoluto'].idxmax()]
-                menor_erro_prod = df_filtrado.loc[df_filtrado['erro_absoluto'].idxmin()]
-                maior_prejuizo_prod = df_filtrado.loc[df_filtrado['prejuizo'].idxmax()]
+                with diag.etapa('destaques'):
+                    maior_erro_prod = df_filtrado.loc[df_filtrado['erro_absoluto'].idxmax()]
+                    menor_erro_prod = df_filtrado.loc[df_filtrado['erro_absoluto'].idxmin()]
+                    maior_prejuizo_prod = df_filtrado.loc[df_filtrado['prejuizo'].idxmax()]
+                    nome_maior_prejuizo, nome_maior_erro, nome_menor_erro = rede.rotulo(
+                        df_filtrado.loc[[maior_prejuizo_prod.name, maior_erro_prod.name, menor_erro_prod.name]])
 
                 col_destaque1, col_destaque2, col_destaque3 = st.columns(3)
                 with col_destaque1:
                     st.markdown(f"##### 🎯 Maior Prejuízo")
                     st.metric(
-                        label=maior_prejuizo_prod['produto'],
+                        label=nome_maior_prejuizo,
                         value=f"R$ {maior_prejuizo_prod['prejuizo']:,.2f}",
                         help=f"Este produto sozinho gerou o maior impacto financeiro negativo devido ao erro de previsão."
                     )
                 with col_destaque2:
                     st.markdown(f"##### 👎 Maior Erro (unidades)")
                     st.metric(
-                        label=maior_erro_prod['produto'],
+                        label=nome_maior_erro,
                         value=f"{maior_erro_prod['erro_absoluto']:,.0f} un.",
                         help="Este produto teve a maior diferença absoluta entre a venda real e a prevista."
                     )
                 with col_destaque3:
                     st.markdown(f"##### 👍 Menor Erro (unidades)")
                     st.metric(
-                        label=menor_erro_prod['produto'],
+                        label=nome_menor_erro,
                         value=f"{menor_erro_prod['erro_absoluto']:,.0f} un.",
                         help="Este produto teve a previsão mais próxima da realidade em unidades."
                     )
@@ -266,26 +456,91 @@ if uploaded_file:
                     st.metric("WMAPE", f"{wmape:.2f} %", help="Erro Percentual Médio Ponderado")
                 with col2:
                     st.metric("Bias Total", f"{bias_total:.2f} un.", help="Viés da previsão. Positivo = Superestimado (Otimista)")
-                    st.metric("Prejuízo Total", f"R$ {df_filtrado['prejuizo'].sum():,.2f}", help="Soma do impacto financeiro dos erros")
+                    st.metric("Prejuízo Total", f"R$ {indicadores['prejuizo_total']:,.2f}", help="Soma do impacto financeiro dos erros")
                 with col3:
                     st.metric("Giro de Estoque", f"{giro_estoque:.2f}", help="Vendas / Estoque Médio (em valor)")
                     st.metric("MAD", f"{mad:.2f}", help="Erro médio absoluto em unidades.")
                 with col4:
                     st.metric("Meta de OTIF", f"{meta_otif:.1f} %", help="% de pedidos que devem ser entregues no prazo e completos.")
-                    st.metric("Itens para Pedir Agora", f"{df_filtrado[df_filtrado['Status_Estoque'] == 'PEDIR AGORA!'].shape[0]}", help="Produtos abaixo do ponto de pedido.")
+                    st.metric("Itens para Pedir Agora", f"{indicadores['itens_pedir']}", help="Produtos abaixo do ponto de pedido.")
 
                 st.markdown("---")
 
+                # --- VISÃO POR LOCAL E REDE ---
+                if multi_local:
+                    st.subheader("🏭 Visão por Local e Rede")
+                    with diag.etapa('consolidacao_rede') as info:
+                        df_produtos, df_locais = etapa_rede(chave_dados, parametros_estoque, mascara, df_filtrado)
+                        indicadores_rede = rede.indicadores_rede(df_produtos)
+                        info['produtos'] = len(df_produtos)
+                    col_r1, col_r2, col_r3, col_r4 = st.columns(4)
+                    col_r1.metric("Locais", f"{len(df_locais)}")
+                    col_r2.metric("SS Somado dos Locais", f"R$ {indicadores_rede['valor_ss_locais']:,.2f}",
+                                  help="Valor do estoque de segurança calculado separadamente em cada local.")
+                    col_r3.metric("SS Agrupado (Rede)", f"R$ {indicadores_rede['valor_ss_agrupado']:,.2f}",
+                                  help="Valor do estoque de segurança se a demanda de todos os locais fosse atendida por um estoque único.")
+                    col_r4.metric("Redução pelo Agrupamento", f"{indicadores_rede['reducao_pooling_percentual']:.1f} %",
+                                  help="Quanto do estoque de segurança o agrupamento (pooling) economizaria.")
+
+                    st.markdown("<h6>Resumo por Local</h6>", unsafe_allow_html=True)
+                    st.dataframe(df_locais, hide_index=True)
+                    st.markdown("<h6>Consolidado por Produto (maiores consumos da rede)</h6>", unsafe_allow_html=True)
+                    st.dataframe(df_produtos[rede.COLUNAS_PRODUTO_PARA_EXIBIR].head(50), hide_index=True)
+                    st.caption(f"{indicadores_rede['produtos_pedir_rede']:,} produtos abaixo do ROP agrupado da rede; "
+                               f"{indicadores_rede['produtos_com_local_pedir']:,} com ao menos um local abaixo do ROP.")
+                    st.download_button(
+                        "⬇️ Baixar consolidado por produto (CSV)",
+                        data=lambda: tabela.exportar_csv(df_produtos, rede.COLUNAS_PRODUTO_PARA_EXIBIR),
+                        file_name="consolidado_rede.csv",
+                        mime="text/csv",
+                    )
+                    st.markdown("---")
+
                 # --- TABELA DETALHADA ---
                 st.subheader("📋 Análise Detalhada por Produto")
-                colunas_para_exibir = [
-                    'produto', 'Curva_ABC', 'real', 'previsto', 'erro_absoluto', 'prejuizo',
-                    'estoque_seguranca', 'Ponto_de_Pedido', 'LEC_EOQ', 'Pedido_Recomendado', 'estoque', 'Status_Estoque'
-                ]
+                colunas_para_exibir = motor.colunas_para_exibir(df_filtrado)
+                # Filtros, ordenação e paginação são feitos no servidor: só a página visível é enviada
+                col_t1, col_t2, col_t3 = st.columns([2, 1, 1])
+                with col_t1:
+                    busca_tabela = st.text_input("Buscar produto", value="", key="busca_tabela",
+                                                 help="Mostra os produtos cujo nome contém o texto digitado.")
+                with col_t2:
+                    classes_tabela = st.multiselect("Curva ABC", options=['A', 'B', 'C'], default=[], key="classes_tabela")
+                with col_t3:
+                    status_tabela = st.multiselect("Status", options=motor.STATUS_ESTOQUE, default=[], key="status_tabela")
+
+                col_t4, col_t5, col_t6, col_t7 = st.columns(4)
+                with col_t4:
+                    ordenar_por = st.selectbox("Ordenar por", options=['Valor de consumo'] + colunas_para_exibir, key="ordenar_tabela")
+                with col_t5:
+                    ordem_crescente = st.toggle("Ordem crescente", value=False, key="ordem_tabela")
+                with col_t6:
+                    tamanho_pagina = st.selectbox("Linhas por página", options=[25, 50, 100, 500], index=1, key="tamanho_pagina")
+
+                with diag.etapa('tabela_filtro_ordenacao'):
+                    posicoes = tabela.filtrar_posicoes(df_filtrado, classes_tabela, status_tabela, busca_tabela.strip())
+                    if ordenar_por != 'Valor de consumo':
+                        posicoes = tabela.ordenar_posicoes(df_filtrado, posicoes, ordenar_por, ordem_crescente)
+                    elif ordem_crescente:
+                        posicoes = posicoes[::-1]
+                    n_paginas = tabela.total_paginas(len(posicoes), tamanho_pagina)
+                with col_t7:
+                    numero_pagina = st.number_input("Página", min_value=1, max_value=n_paginas, value=1, key="pagina_tabela")
+
                 # Arredondar colunas para melhor visualização
-                df_display = df_filtrado[colunas_para_exibir].copy()
-                df_display['estoque_seguranca'] = df_display['estoque_seguranca'].round(1)
-                st.dataframe(df_display)
+                with diag.etapa('tabela_pagina'):
+                    df_display = tabela.pagina(df_filtrado, posicoes, numero_pagina, tamanho_pagina, colunas_para_exibir)
+                    df_display = df_display.assign(estoque_seguranca=df_display['estoque_seguranca'].round(1))
+                    st.dataframe(df_display)
+                st.caption(f"Página {numero_pagina} de {n_paginas} ({len(posicoes):,} produtos).")
+
+                st.download_button(
+                    "⬇️ Baixar resultado completo (CSV)",
+                    data=lambda: tabela.exportar_csv(df_filtrado, colunas_para_exibir),
+                    file_name="analise_estoque.csv",
+                    mime="text/csv",
+                    help="Exporta todos os produtos selecionados, gerando o arquivo em blocos no momento do download."
+                )
 
 
 
@@ -297,23 +552,26 @@ if uploaded_file:
                 col_g1, col_g2 = st.columns(2)
                 with col_g1:
                     st.markdown("<h6>Distribuição do Valor por Classe ABC</h6>", unsafe_allow_html=True)
-                    abc_summary = df_filtrado.groupby('Curva_ABC')['valor_consumo'].sum().reset_index()
-                    fig_abc = px.pie(abc_summary, values='valor_consumo', names='Curva_ABC', 
-                                     color='Curva_ABC', color_discrete_map={'A':'#4CAF50', 'B':'#FFC107', 'C':'#F44336'})
-                    fig_abc.update_layout(margin=dict(l=0, r=0, t=0, b=0))
-                    st.plotly_chart(fig_abc, use_container_width=True)
+                    with diag.etapa('grafico_abc'):
+                        abc_summary = df_filtrado.groupby('Curva_ABC')['valor_consumo'].sum().reset_index()
+                        fig_abc = px.pie(abc_summary, values='valor_consumo', names='Curva_ABC', 
+                                         color='Curva_ABC', color_discrete_map=graficos.CORES_ABC)
+                        fig_abc.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+                        st.plotly_chart(fig_abc, use_container_width=True)
 
                 with col_g2:
                     st.markdown("<h6>Estoque Atual vs. Ponto de Pedido (Itens Críticos)</h6>", unsafe_allow_html=True)
-                    df_status = df_filtrado[df_filtrado['Status_Estoque'] == 'PEDIR AGORA!'].sort_values(by='valor_consumo', ascending=False).head(15)
-                    if not df_status.empty:
-                        fig_rop = px.bar(df_status, x='produto', y=['estoque', 'Ponto_de_Pedido'],
-                                         barmode='group', labels={'value': 'Quantidade', 'variable': 'Métrica'},
-                                         color_discrete_map={'estoque':'lightblue', 'Ponto_de_Pedido':'salmon'})
-                        fig_rop.update_layout(margin=dict(l=0, r=0, t=0, b=0))
-                        st.plotly_chart(fig_rop, use_container_width=True)
-                    else:
-                        st.success("✅ Todos os itens estão com estoque acima do Ponto de Pedido.")
+                    with diag.etapa('grafico_rop'):
+                        df_status = df_filtrado[df_filtrado['Status_Estoque'] == motor.STATUS_PEDIR].nlargest(15, 'valor_consumo')
+                        if not df_status.empty:
+                            df_status = df_status.assign(produto=rede.rotulo(df_status))
+                            fig_rop = px.bar(df_status, x='produto', y=['estoque', 'Ponto_de_Pedido'],
+                                             barmode='group', labels={'value': 'Quantidade', 'variable': 'Métrica'},
+                                             color_discrete_map={'estoque':'lightblue', 'Ponto_de_Pedido':'salmon'})
+                            fig_rop.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+                            st.plotly_chart(fig_rop, use_container_width=True)
+                        else:
+                            st.success("✅ Todos os itens estão com estoque acima do Ponto de Pedido.")
 
                 # --- GRÁFICOS DE ACURÁCIA DA PREVISÃO ---
                 st.markdown("---")
@@ -322,54 +580,240 @@ if uploaded_file:
                 col_g3, col_g4 = st.columns(2)
                 with col_g3:
                     st.markdown("<h6>Prejuízo por Produto (Top 20)</h6>", unsafe_allow_html=True)
-                    df_plot = df_filtrado.sort_values('prejuizo', ascending=False).head(20)
-                    fig_prejuizo = px.bar(df_plot, x='produto', y='prejuizo', color='Curva_ABC',
-                                          color_discrete_map={'A':'#4CAF50', 'B':'#FFC107', 'C':'#F44336'})
-                    st.plotly_chart(fig_prejuizo, use_container_width=True)
+                    with diag.etapa('grafico_prejuizo'):
+                        df_plot = df_filtrado.nlargest(20, 'prejuizo')
+                        df_plot = df_plot.assign(produto=rede.rotulo(df_plot))
+                        fig_prejuizo = px.bar(df_plot, x='produto', y='prejuizo', color='Curva_ABC',
+                                              color_discrete_map=graficos.CORES_ABC)
+                        st.plotly_chart(fig_prejuizo, use_container_width=True)
 
                 with col_g4:
                     st.markdown("<h6>Dispersão: Previsto vs. Real</h6>", unsafe_allow_html=True)
-                    scatter_fig = px.scatter(df_filtrado, x='real', y='previsto', color='Curva_ABC', size='prejuizo', hover_name='produto',
-                                             labels={'real': 'Valor Real', 'previsto': 'Valor Previsto'},
-                                             color_discrete_map={'A':'#4CAF50', 'B':'#FFC107', 'C':'#F44336'})
-                    max_val = max(df_filtrado['real'].max(), df_filtrado['previsto'].max()) * 1.05
-                    scatter_fig.add_shape(type='line', x0=0, y0=0, x1=max_val, y1=max_val, line=dict(color='gray', dash='dash'))
-                    st.plotly_chart(scatter_fig, use_container_width=True)
+                    with diag.etapa('grafico_dispersao'):
+                        scatter_fig, modo_dispersao = graficos.dispersao_previsto_real(df_filtrado)
+                        st.plotly_chart(scatter_fig, use_container_width=True)
+                        if modo_dispersao == 'densidade':
+                            st.caption(f"{len(df_filtrado):,} produtos: exibindo a densidade de pontos em vez de cada produto.")
                     with st.expander("📖 Explicação do Gráfico"):
                         st.markdown("""
                         Plota cada produto como um ponto (valor real no eixo X, previsto no eixo Y). A linha cinza representa a previsão perfeita.
                         - **Pontos acima da linha**: Superestimação (viés otimista).
                         - **Pontos abaixo da linha**: Subestimação (viés pessimista).
                         - **Tamanho da bolha**: Representa o prejuízo financeiro do erro.
+                        
+                        Em seleções grandes, as bolhas dão lugar a pontos em WebGL e, acima de 100 mil produtos, a um mapa de densidade (cor = quantidade de produtos).
                         """)
                     
                 col_g5, col_g6 = st.columns(2)
                 with col_g5:
                     st.markdown("<h6>Distribuição de Prejuízo por Classe e Produto</h6>", unsafe_allow_html=True)
-                    st.plotly_chart(px.treemap(df_filtrado, path=[px.Constant("Todos"), 'Curva_ABC', 'produto'], values='prejuizo',
-                                               color='Curva_ABC', color_discrete_map={'(?)':'#262730', 'A':'#4CAF50', 'B':'#FFC107', 'C':'#F44336'}),
-                                    use_container_width=True)
+                    with diag.etapa('grafico_treemap'):
+                        st.plotly_chart(graficos.treemap_prejuizo(df_filtrado), use_container_width=True)
                     with st.expander("📖 Explicação do Gráfico"):
-                        st.markdown("""
+                        st.markdown(f"""
                         Visualiza a hierarquia do **prejuízo total**, quebrando-o por Classe ABC e, em seguida, por produto. 
                         Permite identificar rapidamente qual classe e quais produtos específicos são os maiores contribuintes para as perdas financeiras.
+                        Os {graficos.PRODUTOS_POR_CLASSE_TREEMAP} maiores prejuízos de cada classe aparecem individualmente; os demais são somados no nó "Outros".
                         """)
 
                 with col_g6:
                     st.markdown("<h6>Real vs. Previsto (Top 20)</h6>", unsafe_allow_html=True)
-                    df_plot = df_filtrado.head(20) # Already sorted by valor_consumo
-                    df_melted = df_plot.melt(id_vars='produto', value_vars=['real', 'previsto'], var_name='tipo', value_name='valor')
-                    st.plotly_chart(px.bar(df_melted, x='produto', y='valor', color='tipo', barmode='group'), use_container_width=True)
+                    with diag.etapa('grafico_real_previsto'):
+                        df_plot = df_filtrado.head(20) # Already sorted by valor_consumo
+                        df_plot = df_plot.assign(produto=rede.rotulo(df_plot))
+                        df_melted = df_plot.melt(id_vars='produto', value_vars=['real', 'previsto'], var_name='tipo', value_name='valor')
+                        st.plotly_chart(px.bar(df_melted, x='produto', y='valor', color='tipo', barmode='group'), use_container_width=True)
                     with st.expander("📖 Explicação do Gráfico"):
                         st.markdown("""
                         Compara lado a lado os valores **reais** e **previstos** para cada produto, permitindo uma análise visual direta da magnitude e direção do erro para os itens mais relevantes em valor.
                         """)
 
+                # --- ACURÁCIA POR CLASSE E NO TEMPO ---
+                st.markdown("---")
+                st.subheader("🎯 Acurácia por Classe e ao Longo do Tempo")
+                frequencia_acuracia = acuracia.frequencia_para(periodos_no_ano) if formato_historico else None
+                janela_acuracia = 1
+                if formato_historico:
+                    janela_acuracia = st.number_input(
+                        "Janela móvel (períodos)", min_value=1, value=3,
+                        help="O período segue 'Períodos no Ano' (12 = meses, 52 = semanas, 4 = trimestres, 365 = dias). "
+                             "As métricas recentes de cada produto usam a mesma janela."
+                    )
+                with diag.etapa('acuracia_periodos') as info:
+                    motor_acuracia = montar_acuracia(hash_arquivo, formato_historico, frequencia_acuracia,
+                                                     conteudo, df_completo)
+                    # Os grupos vêm da Curva_ABC de df_filtrado, que depende dos dados carregados (ex.: janela do histórico)
+                    chave_acuracia = (chave_dados, frequencia_acuracia)
+                    df_acuracia_classes, df_acuracia_janelas, df_acuracia_produtos = etapa_acuracia_periodos(
+                        chave_acuracia, mascara, janela_acuracia, motor_acuracia, df_filtrado)
+                    info['periodos'] = len(motor_acuracia.periodos)
+                historico_multiperiodo = len(motor_acuracia.periodos) > 1
+
+                colunas_classes = ['Curva_ABC', 'produtos', 'wmape', 'fa', 'bias', 'mad']
+                if historico_multiperiodo:
+                    colunas_classes += ['tracking_signal', 'mase']
+                st.markdown("<h6>Indicadores por Classe ABC</h6>", unsafe_allow_html=True)
+                st.dataframe(df_acuracia_classes[colunas_classes], hide_index=True)
+
+                if not historico_multiperiodo:
+                    st.caption("Tracking signal, MASE e a evolução no tempo exigem o histórico diário com mais de um período.")
+                else:
+                    alerta_ts = df_acuracia_produtos['tracking_signal'].abs() > acuracia.LIMITE_TRACKING_SIGNAL
+                    col_a1, col_a2, col_a3 = st.columns(3)
+                    col_a1.metric("Períodos no Histórico", f"{len(motor_acuracia.periodos)}")
+                    col_a2.metric("Produtos com Viés Persistente", f"{int(alerta_ts.sum()):,}",
+                                  help=f"|Tracking signal| acima de {acuracia.LIMITE_TRACKING_SIGNAL:.0f}.")
+                    col_a3.metric("Produtos Piorando", f"{int((df_acuracia_produtos['variacao_wmape'] > 0).sum()):,}",
+                                  help="WMAPE da janela recente maior que o do histórico todo.")
+
+                    col_a4, col_a5 = st.columns(2)
+                    with col_a4:
+                        st.markdown(f"<h6>WMAPE em Janela Móvel de {janela_acuracia} Período(s)</h6>", unsafe_allow_html=True)
+                        with diag.etapa('grafico_acuracia_janela'):
+                            fig_janela = px.line(df_acuracia_janelas, x='periodo', y='wmape', color='grupo', markers=True,
+                                                 color_discrete_map={**graficos.CORES_ABC, 'Total': 'gray'},
+                                                 labels={'periodo': 'Período', 'wmape': 'WMAPE (%)', 'grupo': 'Classe'})
+                            st.plotly_chart(fig_janela, use_container_width=True)
+                    with col_a5:
+                        st.markdown("<h6>Tracking Signal em Janela Móvel</h6>", unsafe_allow_html=True)
+                        with diag.etapa('grafico_tracking_signal'):
+                            fig_ts = px.line(df_acuracia_janelas, x='periodo', y='tracking_signal', color='grupo', markers=True,
+                                             color_discrete_map={**graficos.CORES_ABC, 'Total': 'gray'},
+                                             labels={'periodo': 'Período', 'tracking_signal': 'Tracking Signal', 'grupo': 'Classe'})
+                            for limite in (-acuracia.LIMITE_TRACKING_SIGNAL, acuracia.LIMITE_TRACKING_SIGNAL):
+                                fig_ts.add_hline(y=limite, line_dash='dot', line_color='salmon')
+                            st.plotly_chart(fig_ts, use_container_width=True)
+
+                    st.markdown("<h6>Previsões em Degradação (maior piora do WMAPE recente)</h6>", unsafe_allow_html=True)
+                    st.dataframe(df_acuracia_produtos.nlargest(50, 'variacao_wmape'), hide_index=True)
+                    st.download_button(
+                        "⬇️ Baixar acurácia por produto (CSV)",
+                        data=lambda: df_acuracia_produtos.to_csv(index=False),
+                        file_name="acuracia_por_produto.csv",
+                        mime="text/csv",
+                    )
+                with st.expander("📖 Sobre as métricas"):
+                    st.markdown(f"""
+                    Erro = previsto − real em cada período (mesmo sinal do Bias: positivo = superestimado).
+                    - **WMAPE**: Σ |erro| / Σ real.
+                    - **MAD**: erro absoluto médio por produto e período.
+                    - **Tracking signal**: Σ erro / MAD. Acima de ±{acuracia.LIMITE_TRACKING_SIGNAL:.0f} indica viés persistente. Nas classes, é calculado sobre a soma dos produtos em cada período.
+                    - **MASE**: MAD / erro médio da previsão ingênua (repetir o real do período anterior). Abaixo de 1, a previsão supera a ingênua.
+                    """)
+
+                # --- ANÁLISE DE SENSIBILIDADE ---
+                st.markdown("---")
+                st.subheader("🎛️ Análise de Sensibilidade (What-if)")
+                with st.expander("📖 Como funciona a análise"):
+                    st.markdown("""
+                    Avalia de uma vez uma grade de **níveis de serviço** × **custos de manutenção** × **custos por pedido** para todos os produtos selecionados, sem alterar os parâmetros da barra lateral.
+                    - **Capital em estoque de segurança**: Σ SS × valor unitário. O Z de cada nível vem da inversa da distribuição normal, então qualquer nível pode ser usado.
+                    - **Custo anual**: custo dos pedidos (D / Q × K) + manutenção do estoque médio (Q / 2 + SS, em valor, × H), com Q = Pedido Recomendado.
+                    - **Itens para pedir**: produtos com estoque abaixo do Ponto de Pedido de cada nível de serviço.
+                    """)
+                col_w1, col_w2, col_w3 = st.columns(3)
+                with col_w1:
+                    faixa_servico = st.slider("Faixa de nível de serviço (%)", min_value=50.0, max_value=99.9,
+                                              value=(85.0, 99.5), step=0.1)
+                with col_w2:
+                    opcoes_manutencao = sorted({5.0, 10.0, 15.0, 20.0, 25.0, 30.0, 40.0, 50.0, float(custo_manutencao_percentual)})
+                    custos_manutencao_grade = st.multiselect("Custos de manutenção (%)", options=opcoes_manutencao,
+                                                             default=sorted({10.0, 20.0, 30.0, float(custo_manutencao_percentual)}))
+                with col_w3:
+                    opcoes_pedido = sorted({25.0, 50.0, 100.0, 200.0, 500.0, float(custo_pedido)})
+                    custos_pedido_grade = st.multiselect("Custos por pedido (R$)", options=opcoes_pedido,
+                                                         default=sorted({50.0, float(custo_pedido)}))
+
+                if st.toggle("Executar análise de sensibilidade", help="A grade é armazenada em cache para os mesmos parâmetros."):
+                    if not custos_manutencao_grade or not custos_pedido_grade:
+                        st.warning("Selecione ao menos um custo de manutenção e um custo por pedido.")
+                    else:
+                        niveis_grade = tuple(np.round(np.linspace(faixa_servico[0], faixa_servico[1], 25), 2) / 100)
+                        with diag.etapa('sensibilidade') as info:
+                            df_grade = etapa_sensibilidade(chave_dados, parametros_estoque, mascara, niveis_grade,
+                                                           tuple(custos_manutencao_grade), tuple(custos_pedido_grade), df_filtrado)
+                            info['combinacoes'] = len(df_grade)
+                        df_grade_display = df_grade.assign(nivel_servico=df_grade['nivel_servico'] * 100)
+                        por_nivel = df_grade_display.drop_duplicates('nivel_servico')
+
+                        col_w4, col_w5 = st.columns(2)
+                        with col_w4:
+                            st.markdown("<h6>Capital em Estoque de Segurança por Nível de Serviço</h6>", unsafe_allow_html=True)
+                            st.plotly_chart(px.line(por_nivel, x='nivel_servico', y='capital_estoque_seguranca', markers=True,
+                                                    labels={'nivel_servico': 'Nível de Serviço (%)', 'capital_estoque_seguranca': 'Capital em SS (R$)'}),
+                                            use_container_width=True)
+                        with col_w5:
+                            st.markdown("<h6>Itens para Pedir por Nível de Serviço</h6>", unsafe_allow_html=True)
+                            st.plotly_chart(px.line(por_nivel, x='nivel_servico', y='itens_pedir', markers=True,
+                                                    labels={'nivel_servico': 'Nível de Serviço (%)', 'itens_pedir': 'Itens para Pedir'}),
+                                            use_container_width=True)
+
+                        st.markdown("<h6>Custo Anual (Pedidos + Manutenção) por Nível de Serviço</h6>", unsafe_allow_html=True)
+                        fig_custo = px.line(
+                            df_grade_display.astype({'custo_manutencao_percentual': str, 'custo_pedido': str}),
+                            x='nivel_servico', y='custo_total_anual', color='custo_manutencao_percentual', line_dash='custo_pedido',
+                            hover_data=['custo_pedidos_anual', 'custo_manutencao_anual'],
+                            labels={'nivel_servico': 'Nível de Serviço (%)', 'custo_total_anual': 'Custo Anual Total (R$)',
+                                    'custo_manutencao_percentual': 'Manutenção (%)', 'custo_pedido': 'Custo por Pedido (R$)'},
+                        )
+                        st.plotly_chart(fig_custo, use_container_width=True)
+                        st.download_button(
+                            "⬇️ Baixar grade completa (CSV)",
+                            data=df_grade_display.to_csv(index=False),
+                            file_name="sensibilidade.csv",
+                            mime="text/csv",
+                        )
+
+                # --- SIMULAÇÃO DE MONTE CARLO ---
+                st.markdown("---")
+                st.subheader("🎲 Simulação do Nível de Serviço (Monte Carlo)")
+                with st.expander("📖 Como funciona a simulação"):
+                    st.markdown("""
+                    Para cada produto, sorteia milhares de cenários de **lead time** e de **demanda durante o lead time** (distribuições gama, que representam bem itens assimétricos e intermitentes) a partir da demanda média e dos desvios padrão do CSV.
+                    - **Nível de serviço simulado**: % dos ciclos em que o Ponto de Pedido atual evita a ruptura.
+                    - **Fill rate simulado**: % da demanda atendida diretamente do estoque, considerando o Pedido Recomendado como tamanho do ciclo.
+                    - **ROP simulado**: Ponto de Pedido necessário para atingir a meta escolhida, sem depender da tabela fixa de Z-scores.
+                    """)
+                col_s1, col_s2, col_s3 = st.columns(3)
+                with col_s1:
+                    meta_simulacao = st.number_input("Meta de serviço (%)", min_value=50.0, max_value=99.9,
+                                                     value=float(nivel_servico_z), step=0.1)
+                with col_s2:
+                    tipo_meta = st.selectbox("Tipo de meta", options=['ciclo', 'fill_rate'],
+                                             format_func={'ciclo': 'Nível de serviço por ciclo', 'fill_rate': 'Fill rate'}.get)
+                with col_s3:
+                    n_simulacoes = st.select_slider("Simulações por produto", options=[1_000, 5_000, 10_000, 20_000], value=5_000)
+
+                if st.toggle("Executar simulação", help="A simulação é armazenada em cache para os mesmos parâmetros."):
+                    with st.spinner("Simulando cenários de demanda e lead time..."), diag.etapa('simulacao'):
+                        df_sim = etapa_simulacao(chave_dados, parametros_estoque, meta_simulacao / 100,
+                                                 tipo_meta, n_simulacoes, df_completo)[mascara]
+                    coluna_servico = 'nivel_servico_simulado' if tipo_meta == 'ciclo' else 'fill_rate_simulado'
+                    abaixo_meta = df_sim[coluna_servico] < meta_simulacao / 100
+
+                    col_m1, col_m2, col_m3 = st.columns(3)
+                    col_m1.metric("Nível de Serviço Simulado (médio)", f"{df_sim['nivel_servico_simulado'].mean() * 100:.2f} %")
+                    col_m2.metric("Fill Rate Simulado (médio)", f"{df_sim['fill_rate_simulado'].mean() * 100:.2f} %")
+                    col_m3.metric("Itens Abaixo da Meta", f"{int(abaixo_meta.sum())}")
+
+                    colunas_sim = ingestao.chaves(df_filtrado.columns) + ['Curva_ABC', 'Ponto_de_Pedido']
+                    df_sim_display = pd.concat([df_filtrado[colunas_sim], df_sim], axis=1)[abaixo_meta]
+                    df_sim_display = df_sim_display.assign(ajuste_ROP=df_sim_display['ROP_Simulado'] - df_sim_display['Ponto_de_Pedido'])
+                    st.markdown("<h6>Produtos abaixo da meta (maiores ajustes de ROP)</h6>", unsafe_allow_html=True)
+                    st.dataframe(df_sim_display.nlargest(50, 'ajuste_ROP'))
+
     except Exception as e:
         st.error(f"❌ Erro ao processar o arquivo: {e}")
 else:
     st.info("Aguardando o envio de um arquivo CSV para iniciar a análise.")
 
+# --- DIAGNÓSTICO ---
+if exibir_diagnostico:
+    with painel_diagnostico:
+        st.metric("Tempo total medido", f"{diag.total_segundos():.3f} s")
+        st.dataframe(diag.tabela(), hide_index=True)
+        st.caption("Etapas em cache aparecem com tempo próximo de zero.")
+
 # --- RODAPÉ ---
 st.markdown("---")
 st.caption("Desenvolvido com ❤️ usando Streamlit e Plotly")
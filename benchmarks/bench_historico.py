@@ -0,0 +1,104 @@
+"""Mede a leitura do histórico diário e confere que o resultado não depende do tamanho do bloco.
+
+O histórico sintético tem várias vendas por produto e dia, então os dias se dividem entre blocos;
+a verificação cobre o arquivo em ordem de data e embaralhado. Casos pequenos conferem também
+a janela de histórico sem vendas nos primeiros dias e o lead time de produtos sem nenhum registro dele.
+
+Uso: python benchmarks/bench_historico.py [--produtos 2000] [--dias 365] [--blocos 1000 50000 500000]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from estoque import historico, motor  # noqa: E402
+
+
+COLUNAS_COMPARADAS = ['real', 'previsto', 'desvio_padrao_demanda_diaria', 'valor_unitario', 'lead_time_dias']
+
+
+def gerar_historico(n_produtos, n_dias, vendas_por_dia=2, semente=0):
+    """Histórico em ordem de data com `vendas_por_dia` linhas por produto e dia (e alguns dias sem venda)."""
+    rng = np.random.default_rng(semente)
+    datas = pd.date_range('2024-01-01', periods=n_dias)
+    n = n_produtos * n_dias * vendas_por_dia
+    df = pd.DataFrame({
+        'produto': np.tile(np.char.add('P', np.arange(n_produtos).astype(str)), n_dias * vendas_por_dia),
+        'data': np.repeat(datas, n_produtos * vendas_por_dia),
+        'real': rng.poisson(3, n),
+        'valor_unitario': 10.0,
+        'lead_time_dias': 7,
+    })
+    df['previsto'] = df['real'] + rng.integers(-2, 3, n)
+    return df[rng.random(n) > 0.2]
+
+
+def ler(conteudo, tamanho_bloco):
+    inicio = time.perf_counter()
+    resultado = historico.ler_historico(io.BytesIO(conteudo), 30, tamanho_bloco=tamanho_bloco)
+    return time.perf_counter() - inicio, resultado.set_index('produto').sort_index()
+
+
+def csv(df):
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def verificar_inicio_janela():
+    """Janela de 15 dias sem vendas nos 3 primeiros: a média conta os 15 dias, não só os 12 com venda."""
+    datas = pd.date_range('2024-01-01', '2024-01-30')
+    datas = datas[(datas < '2024-01-16') | (datas > '2024-01-18')]
+    df = pd.DataFrame({'produto': 'P0', 'data': datas, 'real': 10, 'previsto': 10,
+                       'valor_unitario': 1.0, 'lead_time_dias': 7})
+    resultado = historico.ler_historico(csv(df), 30, janela_dias=15)
+    assert resultado['real'].iloc[0] == 10 * 12 / 15 * 30, resultado['real'].iloc[0]
+
+
+def verificar_lead_time_ausente():
+    """Produto sem lead time observado nem declarado, com estoque zero: recebe a média dos demais e pede."""
+    datas = pd.date_range('2024-01-01', '2024-01-30')
+    df = pd.DataFrame({'produto': np.repeat(['P0', 'P1'], len(datas)), 'data': np.tile(datas, 2), 'real': 9,
+                       'previsto': 9, 'valor_unitario': 1.0, 'estoque': 0.0, 'lead_time_observado': np.nan})
+    df.loc[df['produto'].eq('P0') & df['data'].dt.day.isin([10, 20]), 'lead_time_observado'] = [6, 8]
+    resultado = historico.ler_historico(csv(df), 30).set_index('produto')
+    assert resultado.loc['P1', 'lead_time_dias'] == 7, resultado.loc['P1', 'lead_time_dias']
+    calculado = motor.processar(resultado.reset_index(), **motor.PARAMETROS_PADRAO).set_index('produto')
+    assert calculado.loc['P1', 'Status_Estoque'] == motor.STATUS_PEDIR, calculado.loc['P1', 'Status_Estoque']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--produtos', type=int, default=2000)
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--blocos', type=int, nargs='+', default=[1000, 50_000, 500_000])
+    args = parser.parse_args()
+
+    df = gerar_historico(args.produtos, args.dias)
+    arquivos = {
+        'em ordem': df.to_csv(index=False).encode(),
+        'embaralhado': df.sample(frac=1, random_state=0).to_csv(index=False).encode(),
+    }
+    print(f"{len(df):,} linhas, {args.produtos:,} produtos, {args.dias} dias")
+    print(f"{'arquivo':<14}{'bloco':>10}{'segundos':>10}")
+    referencia = None
+    for nome, conteudo in arquivos.items():
+        for tamanho_bloco in args.blocos:
+            segundos, resultado = ler(conteudo, tamanho_bloco)
+            if referencia is None:
+                referencia = resultado
+            pd.testing.assert_frame_equal(resultado[COLUNAS_COMPARADAS], referencia[COLUNAS_COMPARADAS],
+                                          check_exact=False, rtol=1e-6)
+            print(f"{nome:<14}{tamanho_bloco:>10,}{segundos:>10.2f}")
+    print("Resultados idênticos para todos os tamanhos de bloco.")
+    verificar_inicio_janela()
+    print("Janela sem vendas nos primeiros dias: média desde o início da janela.")
+    verificar_lead_time_ausente()
+    print("Produto sem lead time: usa a média dos demais e não sai como 'OK'.")
+
+
+if __name__ == '__main__':
+    main()
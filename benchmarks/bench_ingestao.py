@@ -0,0 +1,79 @@
+"""Mede a leitura do CSV com produtos repetidos em várias linhas e confere a combinação das linhas.
+
+Concatena um arquivo por local sem a coluna `local`, de modo que cada produto aparece uma vez por
+local. O resultado deve ser o mesmo para qualquer tamanho de bloco (e na leitura inteira com pyarrow)
+e igual ao cálculo direto: quantidades somadas, σ da demanda como √Σσ², preço e lead time ponderados
+pela demanda.
+
+Uso: python benchmarks/bench_ingestao.py [--produtos 200000] [--locais 5] [--blocos 10000 500000]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalogo_sintetico import gerar_catalogo  # noqa: E402
+from estoque import ingestao  # noqa: E402
+
+
+def esperado(df):
+    """Combinação das linhas de cada produto calculada diretamente, sem blocos."""
+    peso = df['real'].astype('float64')
+    g = df.assign(peso=peso, sigma_quad=df['desvio_padrao_demanda_diaria'].astype('float64') ** 2,
+                  **{f'{c}_ponderado': peso * df[c].astype('float64') for c in ingestao.COLUNAS_PONDERADAS}
+                  ).groupby('produto', observed=True)
+    resultado = g[['real', 'previsto', 'estoque']].sum().assign(
+        desvio_padrao_demanda_diaria=np.sqrt(g['sigma_quad'].sum()))
+    for coluna in ingestao.COLUNAS_PONDERADAS:
+        ponderada = g[f'{coluna}_ponderado'].sum() / g['peso'].sum()
+        resultado[coluna] = ponderada.fillna(g[coluna].mean())
+    return resultado.astype('float64')
+
+
+def ler(conteudo, tamanho_bloco):
+    inicio = time.perf_counter()
+    resultado = ingestao.ler_csv(io.BytesIO(conteudo), tamanho_bloco=tamanho_bloco)
+    return time.perf_counter() - inicio, resultado.set_index('produto')
+
+
+def verificar_produto_vazio():
+    conteudo = b"produto,real,previsto,valor_unitario,lead_time_dias\nA,1,1,1,1\n,5,5,1,1\n"
+    for tamanho_bloco in (None, 1):
+        try:
+            ingestao.ler_csv(io.BytesIO(conteudo), tamanho_bloco=tamanho_bloco)
+        except ValueError as erro:
+            assert "sem 'produto'" in str(erro), erro
+        else:
+            raise AssertionError("Linha sem produto foi descartada sem erro.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--produtos', type=int, default=200_000)
+    parser.add_argument('--locais', type=int, default=5)
+    parser.add_argument('--blocos', type=int, nargs='+', default=[10_000, 500_000])
+    args = parser.parse_args()
+
+    df = gerar_catalogo(args.produtos * args.locais, locais=args.locais).drop(columns='local')
+    df.loc[df.index % 7 == 0, 'real'] = 0
+    referencia = esperado(df)
+    conteudo = df.sample(frac=1, random_state=0).to_csv(index=False).encode()
+    print(f"{len(df):,} linhas, {args.produtos:,} produtos em {args.locais} locais")
+    print(f"{'bloco':>10}{'segundos':>10}")
+    for tamanho_bloco in [None] + args.blocos:
+        segundos, resultado = ler(conteudo, tamanho_bloco)
+        resultado = resultado.loc[referencia.index, referencia.columns].astype('float64')
+        pd.testing.assert_frame_equal(resultado, referencia, check_exact=False, rtol=1e-5, check_names=False)
+        print(f"{tamanho_bloco or 'pyarrow':>10}{segundos:>10.2f}")
+    print("Linhas combinadas igual ao cálculo direto em todos os tamanhos de bloco.")
+    verificar_produto_vazio()
+    print("Linhas sem produto são recusadas.")
+
+
+if __name__ == '__main__':
+    main()
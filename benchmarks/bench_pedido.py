@@ -0,0 +1,79 @@
+"""Compara a política de pedido vetorizada (estoque.motor) com a versão original baseada em apply.
+
+Uso: python benchmarks/bench_pedido.py [--linhas 1000000] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalogo_sintetico import gerar_catalogo  # noqa: E402
+from estoque import motor  # noqa: E402
+
+
+PARAMETROS = dict(custo_pedido=50.0, custo_manutencao_percentual=20.0, moq_fornecedor=10,
+                  lote_multiplo=12, periodos_no_ano=12)
+
+
+# --- IMPLEMENTAÇÃO ORIGINAL (linha a linha) ---
+def abc_original(df):
+    def classificar_abc(percentual):
+        if percentual <= 80: return 'A'
+        elif 80 < percentual <= 95: return 'B'
+        else: return 'C'
+    df = df.assign(valor_consumo=df['real'] * df['valor_unitario']).sort_values(by='valor_consumo', ascending=False)
+    df['percentual_acumulado'] = df['valor_consumo'].cumsum() / df['valor_consumo'].sum() * 100
+    df['Curva_ABC'] = df['percentual_acumulado'].apply(classificar_abc)
+    return df
+
+
+def pedido_original(df, custo_pedido, custo_manutencao_percentual, moq_fornecedor, lote_multiplo, periodos_no_ano):
+    df = df.copy()
+    df['demanda_anual'] = df['real'] * periodos_no_ano
+    df['custo_manutencao_unidade'] = df['valor_unitario'] * (custo_manutencao_percentual / 100)
+    numerador = 2 * df['demanda_anual'] * custo_pedido
+    df['LEC_EOQ'] = np.sqrt(numerador / df['custo_manutencao_unidade'].replace(0, np.nan)).fillna(0).round(0)
+    df['Pedido_Ajustado_MOQ'] = df[['LEC_EOQ', 'produto']].apply(
+        lambda row: max(row['LEC_EOQ'], moq_fornecedor), axis=1
+    )
+    df['Pedido_Recomendado'] = np.ceil(df['Pedido_Ajustado_MOQ'] / lote_multiplo) * lote_multiplo
+    return df
+
+
+def cronometrar(funcao, repeticoes):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    df = gerar_catalogo(args.linhas, opcionais=False)
+    por_milhao = 1_000_000 / args.linhas
+
+    t_abc_orig, abc_orig = cronometrar(lambda: abc_original(df), args.repeticoes)
+    t_abc_vet, abc_vet = cronometrar(lambda: motor.calcular_curva_abc(df), args.repeticoes)
+    assert (abc_orig['Curva_ABC'].to_numpy() == abc_vet['Curva_ABC'].to_numpy()).all()
+
+    t_ped_orig, ped_orig = cronometrar(lambda: pedido_original(abc_vet, **PARAMETROS), args.repeticoes)
+    t_ped_vet, ped_vet = cronometrar(lambda: motor.calcular_pedido(abc_vet, **PARAMETROS), args.repeticoes)
+    np.testing.assert_array_equal(ped_orig['Pedido_Recomendado'].to_numpy(), ped_vet['Pedido_Recomendado'].to_numpy())
+
+    print(f"{args.linhas:,} linhas, melhor de {args.repeticoes} (segundos por milhão de linhas)")
+    print(f"{'etapa':<12}{'original':>12}{'vetorizado':>12}{'ganho':>10}")
+    for etapa, t_orig, t_vet in [('Curva ABC', t_abc_orig, t_abc_vet), ('Pedido', t_ped_orig, t_ped_vet)]:
+        print(f"{etapa:<12}{t_orig * por_milhao:>12.3f}{t_vet * por_milhao:>12.3f}{t_orig / t_vet:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
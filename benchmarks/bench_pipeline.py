@@ -0,0 +1,178 @@
+"""Benchmark das etapas do pipeline de estoque sobre catálogos sintéticos.
+
+Mede, para cada tamanho de catálogo, o tempo (mediana de N execuções), a vazão em linhas/s e o pico
+de memória alocada (tracemalloc, numa execução separada) das etapas: acurácia, Curva ABC,
+LEC/Pedido_Recomendado, estoque de segurança/ROP e indicadores agregados. Com --locais, as linhas
+são pares (produto, local) e entram também as consolidações por produto e por local da rede.
+
+Uso:
+    python benchmarks/bench_pipeline.py --tamanhos 10k 100k 1M --salvar base.json
+    python benchmarks/bench_pipeline.py --tamanhos 10k 100k 1M --comparar base.json --limite 0.2
+
+Com --comparar, o script termina com código 1 se alguma etapa ficar mais lenta que a base além
+do limite (fração; 0.2 = 20%). A base guarda a configuração da execução (--locais, --ingestao,
+--repeticoes) e a comparação é recusada (código 2) se a configuração atual for diferente.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalogo_sintetico import gerar_catalogo  # noqa: E402
+from estoque import motor, rede  # noqa: E402
+
+
+SUFIXOS = {'k': 1_000, 'M': 1_000_000}
+
+
+def interpretar_tamanho(texto):
+    if texto[-1] in SUFIXOS:
+        return int(float(texto[:-1]) * SUFIXOS[texto[-1]])
+    return int(texto)
+
+
+def etapas(df, parametros):
+    """Etapas na ordem do app; cada uma recebe as saídas das anteriores já prontas."""
+    z_score = motor.Z_SCORES[parametros['nivel_servico_z']]
+    base, _ = motor.garantir_estoque(df)
+    acuracia = motor.calcular_acuracia(base)
+    abc = motor.calcular_curva_abc(acuracia)
+    pedido = motor.calcular_pedido(abc, parametros['custo_pedido'], parametros['custo_manutencao_percentual'],
+                                   parametros['moq_fornecedor'], parametros['lote_multiplo'], parametros['periodos_no_ano'])
+    rop = motor.calcular_ponto_pedido(abc, z_score, parametros['dias_no_periodo'])
+    completo = abc.join([pedido, rop])
+    medidas = {
+        'acuracia': lambda: motor.calcular_acuracia(base),
+        'curva_abc': lambda: motor.calcular_curva_abc(acuracia),
+        'lec_pedido': lambda: motor.calcular_pedido(abc, parametros['custo_pedido'], parametros['custo_manutencao_percentual'],
+                                                    parametros['moq_fornecedor'], parametros['lote_multiplo'],
+                                                    parametros['periodos_no_ano']),
+        'estoque_seguranca_rop': lambda: motor.calcular_ponto_pedido(abc, z_score, parametros['dias_no_periodo']),
+        'indicadores': lambda: motor.calcular_indicadores(completo),
+    }
+    if rede.tem_locais(completo):
+        medidas['rede_por_produto'] = lambda: rede.consolidar_por_produto(completo)
+        medidas['rede_por_local'] = lambda: rede.consolidar_por_local(completo)
+    return medidas
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    gc.collect()
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Mediana: uma execução atípica (GC, outro processo) não move a referência nem a comparação
+    return statistics.median(tempos), pico
+
+
+def medir_ingestao(df, repeticoes):
+    buffer = io.BytesIO(df.to_csv(index=False).encode())
+
+    def ler():
+        buffer.seek(0)
+        motor.ler_csv(buffer)
+    return medir(ler, repeticoes)
+
+
+def executar(tamanhos, repeticoes, incluir_ingestao=False, parametros=None, locais=None):
+    parametros = parametros or motor.PARAMETROS_PADRAO
+    resultados = {}
+    for linhas in tamanhos:
+        df = gerar_catalogo(linhas, locais=locais)
+        por_etapa = {}
+        if incluir_ingestao:
+            segundos, pico = medir_ingestao(df, repeticoes)
+            por_etapa['ingestao'] = {'segundos': segundos, 'linhas_s': linhas / segundos, 'pico_mb': pico / 1024 ** 2}
+        for nome, funcao in etapas(df, parametros).items():
+            segundos, pico = medir(funcao, repeticoes)
+            por_etapa[nome] = {'segundos': segundos, 'linhas_s': linhas / segundos, 'pico_mb': pico / 1024 ** 2}
+        resultados[str(linhas)] = por_etapa
+        del df
+    return resultados
+
+
+def imprimir(resultados):
+    print(f"{'linhas':>12} {'etapa':<24}{'segundos':>10}{'linhas/s':>14}{'pico MB':>10}")
+    for linhas, por_etapa in resultados.items():
+        for nome, r in por_etapa.items():
+            print(f"{int(linhas):>12,} {nome:<24}{r['segundos']:>10.4f}{r['linhas_s']:>14,.0f}{r['pico_mb']:>10.1f}")
+
+
+def configuracao(args):
+    """Opções que mudam o que é medido; a comparação só vale entre execuções com as mesmas."""
+    return {'locais': args.locais, 'ingestao': args.ingestao, 'repeticoes': args.repeticoes}
+
+
+def comparar(resultados, base, limite, minimo_s):
+    """Lista as etapas que ficaram mais lentas que a base além do limite (ignorando tempos abaixo de `minimo_s`)."""
+    regressoes = []
+    for linhas, por_etapa in resultados.items():
+        for nome, r in por_etapa.items():
+            referencia = base.get(linhas, {}).get(nome)
+            if referencia is None or max(r['segundos'], referencia['segundos']) < minimo_s:
+                continue
+            razao = r['segundos'] / referencia['segundos']
+            if razao > 1 + limite:
+                regressoes.append((int(linhas), nome, referencia['segundos'], r['segundos'], razao))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do pipeline de estoque.")
+    parser.add_argument('--tamanhos', nargs='+', default=['10k', '100k', '1M'],
+                        help="Tamanhos de catálogo (ex: 10k 100k 1M 10M).")
+    parser.add_argument('--repeticoes', type=int, default=5, help="Execuções por etapa; vale a mediana.")
+    parser.add_argument('--ingestao', action='store_true', help="Inclui a leitura do CSV (gera o CSV em memória).")
+    parser.add_argument('--locais', type=int, default=None,
+                        help="Gera cada produto em N locais e mede também as consolidações da rede.")
+    parser.add_argument('--salvar', help="Grava os resultados em JSON para servir de base.")
+    parser.add_argument('--comparar', help="JSON de base; falha se alguma etapa regredir além de --limite.")
+    parser.add_argument('--limite', type=float, default=0.2, help="Regressão tolerada (fração, padrão 0.2).")
+    parser.add_argument('--minimo-ms', type=float, default=25.0,
+                        help="Ignora etapas mais rápidas que isso na comparação (abaixo disso, domina o ruído).")
+    args = parser.parse_args(argv)
+
+    base = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+        if base.get('configuracao') != configuracao(args):
+            print(f"Configuração diferente da base: {base.get('configuracao')} (base) x {configuracao(args)} (atual). "
+                  "Gere uma nova base com --salvar.")
+            return 2
+
+    tamanhos = [interpretar_tamanho(t) for t in args.tamanhos]
+    resultados = executar(tamanhos, args.repeticoes, incluir_ingestao=args.ingestao, locais=args.locais)
+    imprimir(resultados)
+
+    if args.salvar:
+        with open(args.salvar, 'w') as f:
+            json.dump({'configuracao': configuracao(args), 'resultados': resultados}, f, indent=2)
+
+    if base is not None:
+        regressoes = comparar(resultados, base['resultados'], args.limite, args.minimo_ms / 1000)
+        if regressoes:
+            print(f"\nRegressões acima de {args.limite:.0%}:")
+            for linhas, nome, antes, depois, razao in regressoes:
+                print(f"  {linhas:>12,} {nome:<24}{antes:.4f}s -> {depois:.4f}s ({razao:.2f}x)")
+            return 1
+        print(f"\nNenhuma etapa regrediu mais de {args.limite:.0%} em relação à base.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""Gerador de catálogos sintéticos no esquema do CSV (colunas obrigatórias, 'estoque' e desvios padrão)."""
+import numpy as np
+import pandas as pd
+
+from estoque import ingestao
+
+
+def gerar_catalogo(linhas, seed=42, opcionais=True, locais=None):
+    """Catálogo com `linhas` produtos e tipos iguais aos produzidos por `estoque.ingestao`.
+
+    Com `locais`, cada produto aparece em `locais` locais e `linhas` passa a contar os pares
+    (produto, local), como num arquivo de vários depósitos.
+
+    A demanda segue uma gama (muitos itens de giro baixo, poucos de giro alto) e o valor unitário
+    uma lognormal, de modo que a Curva ABC tenha a concentração típica de um catálogo real.
+    """
+    rng = np.random.default_rng(seed)
+    real = rng.gamma(0.8, 120.0, linhas).round(0)
+    codigos = np.arange(linhas) // (locais or 1)
+    df = pd.DataFrame({
+        'produto': pd.Categorical(np.char.add('SKU', np.char.zfill(codigos.astype(str), 9))),
+        'real': real,
+        'previsto': np.maximum(real * rng.normal(1.0, 0.25, linhas), 0).round(0),
+        'valor_unitario': rng.lognormal(3.5, 1.2, linhas).round(2),
+        'lead_time_dias': rng.integers(1, 45, linhas),
+    })
+    if opcionais:
+        df['estoque'] = rng.integers(0, 600, linhas)
+        df['desvio_padrao_demanda_diaria'] = (real / 30 * rng.uniform(0.2, 1.5, linhas)).round(2)
+        df['desvio_padrao_lead_time'] = rng.gamma(1.5, 1.0, linhas).round(2)
+    if locais:
+        nomes_locais = np.array(['CD'] + [f'LOJA{i:03d}' for i in range(1, locais)])
+        df.insert(1, 'local', pd.Categorical(nomes_locais[np.arange(linhas) % locais]))
+    tipos = {c: t for c, t in ingestao.ESQUEMA.items() if c in df.columns and c not in ('produto', 'local')}
+    return df.astype(tipos)
@@ -0,0 +1 @@
+"""Cálculos de acurácia de previsão e gestão de estoque usados pelo app."""
@@ -0,0 +1,5 @@
+import sys
+
+from estoque.lote import main
+
+sys.exit(main())
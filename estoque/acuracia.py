@@ -0,0 +1,350 @@
+"""Acurácia da previsão ao longo do tempo: WMAPE, bias, MAD, tracking signal e MASE.
+
+O histórico é reduzido a um total de real e previsto por produto (ou produto e local) e período.
+Os períodos entram em ordem em `AcuraciaIncremental`, que mantém:
+
+- as somas acumuladas por produto (n, Σ|e|, Σe, Σ|real|, Σ|erro ingênuo|), de onde saem as
+  métricas do histórico todo sem reler os períodos anteriores;
+- matrizes período × produto (real, erro e erro ingênuo, NaN quando o produto não tem registro
+  no período), usadas nas janelas móveis.
+
+Acrescentar um período atualiza só as somas e uma linha das matrizes. As métricas por grupo
+(ex.: Curva_ABC) e por janela são reduções por segmento sobre essas somas, sem laço por produto.
+
+Convenções: erro = previsto − real (mesmo sinal do Bias do app; positivo = superestimado).
+Tracking signal = Σ erro / MAD (em grupos, da série agregada do grupo). MASE = MAD / MAE da
+previsão ingênua (real do período anterior) nos mesmos períodos.
+"""
+import numpy as np
+import pandas as pd
+
+from estoque import historico, ingestao
+
+
+COLUNAS_OBRIGATORIAS_PERIODOS = {'produto', 'data', 'real', 'previsto'}
+
+# Periodicidade das métricas a partir dos períodos no ano da barra lateral (mensal nos demais casos)
+FREQUENCIAS = {365: 'D', 52: 'W', 12: 'M', 4: 'Q', 1: 'Y'}
+
+# |Tracking signal| acima deste limite indica viés persistente da previsão
+LIMITE_TRACKING_SIGNAL = 4.0
+
+# Somas das quais todas as métricas derivam
+SOMAS = ['n', 'soma_erro_abs', 'soma_erro', 'soma_real_abs', 'n_ingenuo', 'soma_erro_ingenuo']
+
+# Separa produto e local na chave interna de texto
+SEPARADOR_CHAVE = '\x1f'
+
+# Elementos das matrizes período × produto reduzidos por vez nas métricas por grupo
+ELEMENTOS_POR_BLOCO = 1 << 22
+
+METRICAS = ['observacoes', 'wmape', 'fa', 'bias', 'mad', 'tracking_signal', 'mase']
+
+
+def frequencia_para(periodos_no_ano):
+    return FREQUENCIAS.get(int(periodos_no_ano), 'M')
+
+
+def calcular_metricas(somas):
+    """Métricas a partir das somas (arrays de mesmo formato); NaN quando a métrica não se aplica."""
+    n = np.asarray(somas['n'], dtype='float64')
+    soma_erro_abs = np.asarray(somas['soma_erro_abs'], dtype='float64')
+    soma_real_abs = np.asarray(somas['soma_real_abs'], dtype='float64')
+    n_ingenuo = np.asarray(somas['n_ingenuo'], dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wmape = np.where(soma_real_abs > 0, soma_erro_abs / soma_real_abs * 100, np.nan)
+        mad = np.where(n > 0, soma_erro_abs / n, np.nan)
+        if 'soma_erro_abs_agregado' in somas:
+            # Grupos: tracking signal da série agregada (Σ erro dos produtos em cada período)
+            mad_agregado = np.where(somas['n_agregado'] > 0, somas['soma_erro_abs_agregado'] / somas['n_agregado'], np.nan)
+        else:
+            mad_agregado = mad
+        tracking_signal = np.where(mad_agregado > 0, somas['soma_erro'] / mad_agregado, np.nan)
+        mae_ingenuo = np.where(n_ingenuo > 0, somas['soma_erro_ingenuo'] / n_ingenuo, np.nan)
+        mase = np.where(mae_ingenuo > 0, mad / mae_ingenuo, np.nan)
+    return {
+        'observacoes': n.astype('int64'),
+        'wmape': wmape,
+        'fa': 100 - wmape,
+        'bias': np.asarray(somas['soma_erro'], dtype='float64'),
+        'mad': mad,
+        'tracking_signal': tracking_signal,
+        'mase': mase,
+    }
+
+
+def _somas_das_matrizes(real, erro, erro_ingenuo):
+    """Somas elemento a elemento (para reduzir depois) a partir das matrizes com NaN = sem registro."""
+    return {
+        'n': ~np.isnan(real),
+        'soma_erro_abs': np.abs(np.nan_to_num(erro)),
+        'soma_erro': np.nan_to_num(erro),
+        'soma_real_abs': np.abs(np.nan_to_num(real)),
+        'n_ingenuo': ~np.isnan(erro_ingenuo),
+        'soma_erro_ingenuo': np.nan_to_num(erro_ingenuo),
+    }
+
+
+def _codigos(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    return pd.factorize(serie, sort=True)
+
+
+class AcuraciaIncremental:
+    """Acumula real e previsto período a período; métricas por produto, grupo e janela móvel."""
+
+    def __init__(self, chave=('produto',)):
+        self.chave = list(chave)
+        self.periodos = []
+        self._indice = None
+        self._somas = {nome: np.zeros(0) for nome in SOMAS}
+        self._ultimo_real = np.zeros(0)
+        self._real = np.zeros((0, 0), dtype='float32')
+        self._erro = np.zeros((0, 0), dtype='float32')
+        self._erro_ingenuo = np.zeros((0, 0), dtype='float32')
+
+    def __len__(self):
+        return 0 if self._indice is None else len(self._indice)
+
+    # --- ENTRADA ---
+    def _chaves(self, df):
+        """Chave de cada linha como texto; com local, 'produto' e 'local' unidos por SEPARADOR_CHAVE
+        (o hash de um índice de texto é bem mais rápido que o de um MultiIndex)."""
+        chave = df[self.chave[0]].astype(str)
+        for coluna in self.chave[1:]:
+            chave = chave + SEPARADOR_CHAVE + df[coluna].astype(str)
+        return pd.Index(chave)
+
+    def _chaves_distintas(self, df):
+        """Chaves distintas de `df`, como em `_chaves`, sem montar o texto de cada linha."""
+        if len(self.chave) == 1:
+            return pd.Index(df[self.chave[0]].unique()).astype(str)
+        return self._chaves(df.drop_duplicates())
+
+    def _colunas_chave(self):
+        if len(self.chave) == 1:
+            return pd.DataFrame({self.chave[0]: self._indice})
+        partes = self._indice.str.split(SEPARADOR_CHAVE, n=len(self.chave) - 1, expand=True)
+        return pd.DataFrame({coluna: partes.get_level_values(i) for i, coluna in enumerate(self.chave)})
+
+    def _reservar(self, linhas, periodos):
+        """Garante capacidade nas matrizes e nas somas.
+
+        Só o eixo dos períodos dobra (acrescentar um período por vez não realoca sempre); o dos
+        produtos cresce o necessário, pois multiplica o tamanho de todas as linhas das matrizes.
+        """
+        capacidade_periodos, capacidade_linhas = self._real.shape
+        if linhas <= capacidade_linhas and periodos <= capacidade_periodos:
+            return
+        nova = (max(periodos, 2 * capacidade_periodos) if periodos > capacidade_periodos else capacidade_periodos,
+                max(linhas, capacidade_linhas))
+        for nome in ('_real', '_erro', '_erro_ingenuo'):
+            antiga = getattr(self, nome)
+            matriz = np.full(nova, np.nan, dtype='float32')
+            matriz[:antiga.shape[0], :antiga.shape[1]] = antiga
+            setattr(self, nome, matriz)
+        if nova[1] > capacidade_linhas:
+            for nome, valores in self._somas.items():
+                self._somas[nome] = np.concatenate([valores, np.zeros(nova[1] - len(valores))])
+            self._ultimo_real = np.concatenate([self._ultimo_real, np.full(nova[1] - len(self._ultimo_real), np.nan)])
+
+    def adicionar_periodo(self, periodo, df):
+        """Acrescenta os totais de um período (colunas da chave, `real` e `previsto`).
+
+        Os períodos devem chegar em ordem crescente. Produtos novos ganham uma linha; produtos
+        sem registro no período não contam nele. Só as somas e a linha do período nas matrizes são atualizadas.
+        """
+        if self.periodos and not periodo > self.periodos[-1]:
+            raise ValueError(f"O período {periodo} não é posterior ao último período acumulado ({self.periodos[-1]}).")
+        df = df[df['real'].notna() & df['previsto'].notna()]
+        # Um hash por período: códigos das chaves (somando repetições) e busca só das chaves distintas
+        codigos, chaves = pd.factorize(self._chaves(df))
+        real = np.bincount(codigos, weights=df['real'].to_numpy(dtype='float64'), minlength=len(chaves))
+        previsto = np.bincount(codigos, weights=df['previsto'].to_numpy(dtype='float64'), minlength=len(chaves))
+
+        if self._indice is None:
+            self._indice = chaves[:0]
+        linhas = self._indice.get_indexer(chaves)
+        novos = linhas < 0
+        if novos.any():
+            inicio = len(self._indice)
+            self._indice = self._indice.append(chaves[novos])
+            linhas[novos] = np.arange(inicio, len(self._indice))
+        posicao = len(self.periodos)
+        self._reservar(len(self._indice), posicao + 1)
+
+        erro = previsto - real
+        # Previsão ingênua: o real do último período com registro do mesmo produto
+        erro_ingenuo = np.abs(real - self._ultimo_real[linhas])
+        tem_ingenuo = ~np.isnan(erro_ingenuo)
+
+        self._real[posicao, linhas] = real
+        self._erro[posicao, linhas] = erro
+        self._erro_ingenuo[posicao, linhas] = erro_ingenuo
+        somas = self._somas
+        somas['n'][linhas] += 1
+        somas['soma_erro_abs'][linhas] += np.abs(erro)
+        somas['soma_erro'][linhas] += erro
+        somas['soma_real_abs'][linhas] += np.abs(real)
+        somas['n_ingenuo'][linhas] += tem_ingenuo
+        somas['soma_erro_ingenuo'][linhas] += np.where(tem_ingenuo, erro_ingenuo, 0.0)
+        self._ultimo_real[linhas] = real
+        self.periodos.append(periodo)
+
+    @classmethod
+    def de_periodos(cls, df_periodos, chave=None):
+        """Monta o acumulador a partir de uma tabela longa (chave, `periodo`, `real`, `previsto`).
+
+        Todas as chaves e períodos já são conhecidos, então as matrizes são alocadas uma vez, no tamanho exato.
+        """
+        acuracia = cls(chave or ingestao.chaves(df_periodos.columns))
+        registrados = df_periodos['real'].notna() & df_periodos['previsto'].notna()
+        acuracia._indice = acuracia._chaves_distintas(df_periodos.loc[registrados, acuracia.chave])
+        # Linhas de cada período por posição: o groupby copiaria a tabela longa inteira, ordenada, para iterar
+        codigos, periodos = pd.factorize(df_periodos['periodo'], sort=True)
+        ordem = np.argsort(codigos, kind='stable')
+        limites = np.count_nonzero(codigos < 0) + np.r_[0, np.cumsum(np.bincount(codigos[codigos >= 0], minlength=len(periodos)))]
+        acuracia._reservar(len(acuracia._indice), len(periodos))
+        for i, periodo in enumerate(periodos):
+            acuracia.adicionar_periodo(periodo, df_periodos.take(ordem[limites[i]:limites[i + 1]]))
+        return acuracia
+
+    # --- SELEÇÃO ---
+    def _somas_janela(self, linhas, janela):
+        """Somas por produto das `linhas` nos últimos `janela` períodos, direto das matrizes."""
+        periodos = slice(max(0, len(self.periodos) - janela), len(self.periodos))
+        somas = _somas_das_matrizes(self._real[periodos, linhas], self._erro[periodos, linhas],
+                                    self._erro_ingenuo[periodos, linhas])
+        return {nome: valores.sum(axis=0, dtype='float64') for nome, valores in somas.items()}
+
+    def _linhas(self, df):
+        """Posições dos produtos de `df` no acumulador (-1 para produtos sem histórico)."""
+        if self._indice is None:
+            return np.full(len(df), -1)
+        return self._indice.get_indexer(self._chaves(df))
+
+    # --- MÉTRICAS ---
+    def por_produto(self, janela_recente=None, df=None, colunas=()):
+        """Uma linha por produto com as métricas do histórico todo.
+
+        Com `janela_recente`, acrescenta as mesmas métricas nos últimos N períodos (sufixo
+        `_recente`) e `variacao_wmape` (recente − histórico; positivo = previsão piorando).
+        Com `df`, restringe aos produtos de `df` com histórico, copiando também `colunas` de `df`.
+        """
+        if df is None:
+            linhas = np.arange(len(self))
+            res = self._colunas_chave()
+        else:
+            linhas = self._linhas(df)
+            validos = linhas >= 0
+            linhas = linhas[validos]
+            res = df.loc[validos, [*self.chave, *colunas]].reset_index(drop=True)
+        res = res.assign(**calcular_metricas({nome: valores[linhas] for nome, valores in self._somas.items()}))
+        if janela_recente:
+            recentes = calcular_metricas(self._somas_janela(linhas, janela_recente))
+            res = res.assign(**{f'{nome}_recente': valores for nome, valores in recentes.items()})
+            res['variacao_wmape'] = res['wmape_recente'] - res['wmape']
+        return res
+
+    def _series_por_grupo(self, df, coluna):
+        """Somas por grupo de `coluna` (mais o 'Total') e período para os produtos de `df`.
+
+        As matrizes são percorridas em blocos de períodos (views, sem copiar as colunas dos produtos)
+        e cada bloco é reduzido aos grupos multiplicando pela matriz indicadora produto × grupo.
+        Retorna (rótulos, produtos por grupo, somas com formato grupos × períodos).
+        """
+        linhas = self._linhas(df)
+        if coluna is None:
+            codigos, grupos = np.zeros(len(df), dtype='int64'), pd.Index([])
+        else:
+            codigos, grupos = _codigos(df[coluna])
+        validos = (linhas >= 0) & (codigos >= 0)
+        periodos = len(self.periodos)
+        if not validos.any() or periodos == 0:
+            return [], np.zeros(0, dtype='int64'), None
+
+        presentes, grupo = np.unique(codigos[validos], return_inverse=True)
+        total = coluna is not None
+        indicadora = np.zeros((self._real.shape[1], len(presentes) + total))
+        np.add.at(indicadora, (linhas[validos], grupo), 1)
+        if total:
+            indicadora[:, -1] = indicadora[:, :-1].sum(axis=1)
+        produtos = indicadora.sum(axis=0).astype('int64')
+
+        somas = {nome: np.empty((indicadora.shape[1], periodos)) for nome in SOMAS}
+        passo = max(1, ELEMENTOS_POR_BLOCO // indicadora.shape[0])
+        for inicio in range(0, periodos, passo):
+            bloco = slice(inicio, min(inicio + passo, periodos))
+            matrizes = _somas_das_matrizes(self._real[bloco], self._erro[bloco], self._erro_ingenuo[bloco])
+            for nome, valores in matrizes.items():
+                somas[nome][:, bloco] = (valores.astype('float64') @ indicadora).T
+        rotulos = [str(grupos[c]) for c in presentes] if total else []
+        rotulos.append('Total')
+
+        # Série agregada do grupo, para o tracking signal: |Σ erro| de cada período e períodos com registro
+        somas['soma_erro_abs_agregado'] = np.abs(somas['soma_erro'])
+        somas['n_agregado'] = somas['n'] > 0
+        return rotulos, produtos, somas
+
+    def por_grupo(self, df, coluna):
+        """Métricas do histórico todo por valor de `coluna` (ex.: Curva_ABC) para os produtos de `df`,
+        mais uma linha 'Total'.
+        """
+        rotulos, produtos, somas = self._series_por_grupo(df, coluna)
+        if somas is None:
+            return pd.DataFrame(columns=[coluna, 'produtos', *METRICAS])
+        totais = {nome: valores.sum(axis=1) for nome, valores in somas.items()}
+        return pd.DataFrame({coluna: rotulos, 'produtos': produtos}).assign(**calcular_metricas(totais))
+
+    def por_janela(self, df, janela, coluna=None):
+        """Métricas em janelas móveis de `janela` períodos, por grupo de `coluna` e no total de `df`.
+
+        Uma linha por (período final da janela, grupo); as janelas são diferenças da soma acumulada
+        ao longo dos períodos.
+        """
+        rotulos, _, somas = self._series_por_grupo(df, coluna)
+        if somas is None:
+            return pd.DataFrame(columns=['periodo', 'grupo', *METRICAS])
+        janelas = {}
+        for nome, valores in somas.items():
+            acumulado = np.cumsum(valores, axis=1)
+            anterior = np.zeros_like(acumulado)
+            anterior[:, janela:] = acumulado[:, :-janela]
+            janelas[nome] = (acumulado - anterior).ravel()
+
+        periodos = len(self.periodos)
+        res = pd.DataFrame({
+            'periodo': np.tile(np.asarray([str(p) for p in self.periodos], dtype=object), len(rotulos)),
+            'grupo': np.repeat(rotulos, periodos),
+        })
+        return res.assign(**calcular_metricas(janelas))
+
+
+# --- LEITURA DO HISTÓRICO ---
+def _totais_por_periodo(bloco, frequencia):
+    chave = ingestao.chaves(bloco.columns)
+    bloco = bloco.assign(periodo=bloco['data'].dt.to_period(frequencia))
+    return bloco.groupby(chave + ['periodo'], sort=False)[['real', 'previsto']].sum(min_count=1)
+
+
+def ler_periodos(arquivo, frequencia='M', tamanho_bloco=ingestao.TAMANHO_BLOCO_PADRAO):
+    """Lê o histórico diário em blocos e devolve real e previsto somados por produto (e local) e período."""
+    historico.validar_cabecalho(arquivo, COLUNAS_OBRIGATORIAS_PERIODOS)
+    acc = None
+    colunas = lambda c: c in COLUNAS_OBRIGATORIAS_PERIODOS or ingestao.SINONIMOS.get(c, c) == 'local'
+    leitor = pd.read_csv(arquivo, usecols=colunas, dtype=ingestao.ESQUEMA_LEITURA, parse_dates=['data'],
+                         chunksize=tamanho_bloco)
+    for numero, bloco in enumerate(leitor, start=1):
+        bloco = ingestao.normalizar_colunas(bloco)
+        ingestao.validar_bloco(bloco, numero, COLUNAS_OBRIGATORIAS_PERIODOS)
+        parcial = _totais_por_periodo(bloco, frequencia)
+        acc = parcial if acc is None else pd.concat([acc, parcial]).groupby(level=list(parcial.index.names), sort=False).sum(min_count=1)
+
+    if acc is None:
+        raise ValueError("O histórico não contém linhas de dados.")
+    return acc.reset_index()
+
+
+def ler_historico(arquivo, frequencia='M', tamanho_bloco=ingestao.TAMANHO_BLOCO_PADRAO):
+    return AcuraciaIncremental.de_periodos(ler_periodos(arquivo, frequencia, tamanho_bloco))
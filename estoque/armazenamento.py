@@ -0,0 +1,136 @@
+"""Armazenamento persistente dos resultados por produto, chaveado por arquivo e parâmetros.
+
+Guarda dois tipos de snapshot, ambos tabelas do motor por produto:
+
+- o catálogo de um arquivo (ingestão, acurácia e Curva ABC), chaveado só pelos dados de entrada.
+  Não depende da barra lateral, então é gravado uma vez por arquivo, e LEC, SS e ROP são
+  recalculados a partir dele;
+- a análise completa (todas as colunas derivadas até Status_Estoque) para um arquivo e um conjunto
+  de parâmetros, gravada apenas quando o analista a salva, para que explorar parâmetros não
+  encha o armazenamento.
+
+Reabrir a mesma análise, inclusive em outra sessão ou por outro analista no mesmo servidor, lê o
+snapshot do disco com memory map em vez de refazer a ingestão e os cálculos. Os snapshots menos
+usados recentemente são removidos quando o total passa do limite de tamanho.
+
+O formato é Arrow IPC (Feather v2) sem compressão: colunar como o Parquet, mas com o layout de
+memória do Arrow, de modo que o memory map é lido sem decodificação nem cópia.
+
+Uso:
+    armazem = ArmazemResultados()
+    catalogo = armazem.carregar(chave_snapshot(chave_dados))               # (df, metadados) ou None
+    armazem.salvar(chave_snapshot(chave_dados, parametros_estoque), df, {'tinha_estoque': True})
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+# Muda quando as colunas ou as fórmulas do motor mudam, invalidando snapshots antigos
+VERSAO_SNAPSHOT = 3
+
+PASTA_PADRAO = os.environ.get('ESTOQUE_ARMAZEM', os.path.join(Path.home(), '.cache', 'gestao-estoque'))
+LIMITE_MB_PADRAO = float(os.environ.get('ESTOQUE_ARMAZEM_MB', 1024))
+
+EXTENSAO = '.arrow'
+_CHAVE_METADADOS = b'estoque.metadados'
+
+
+def chave_snapshot(chave_dados, parametros=()):
+    """Chave estável (hex) a partir da chave dos dados de entrada e dos parâmetros de cálculo
+    (sem parâmetros, a do catálogo do arquivo)."""
+    conteudo = json.dumps([VERSAO_SNAPSHOT, list(chave_dados), list(parametros)], default=str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def _para_pandas(tabela):
+    """Converte o snapshot para pandas; colunas dicionário viram category direto dos códigos.
+
+    A conversão padrão do pyarrow reconstrói as categorias (uma por produto), o que domina o tempo
+    de leitura; os códigos e o dicionário do arquivo já têm tudo o que o Categorical precisa.
+    """
+    dicionarios = [campo.name for campo in tabela.schema if pa.types.is_dictionary(campo.type)]
+    df = tabela.drop_columns(dicionarios).to_pandas(split_blocks=True)
+    for nome in dicionarios:
+        coluna = tabela.column(nome).combine_chunks()
+        codigos = coluna.indices.fill_null(-1).to_numpy()
+        df[nome] = pd.Categorical.from_codes(codigos, categories=coluna.dictionary.to_pandas())
+    return df[[c for c in tabela.column_names if c in df.columns]]
+
+
+class ArmazemResultados:
+    def __init__(self, pasta=PASTA_PADRAO, limite_mb=LIMITE_MB_PADRAO):
+        self.pasta = Path(pasta)
+        self.limite_bytes = int(limite_mb * 1024 ** 2)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+
+    def _caminho(self, chave):
+        return self.pasta / f"{chave}{EXTENSAO}"
+
+    def carregar(self, chave):
+        """Lê o snapshot com memory map e marca o acesso (para o LRU). Retorna (df, metadados) ou None."""
+        caminho = self._caminho(chave)
+        try:
+            tabela = feather.read_table(caminho, memory_map=True)
+        except (FileNotFoundError, pa.ArrowInvalid, OSError):
+            return None
+        try:
+            os.utime(caminho)
+        except OSError:
+            pass
+        metadados = json.loads((tabela.schema.metadata or {}).get(_CHAVE_METADADOS, b'{}'))
+        return _para_pandas(tabela), metadados
+
+    def salvar(self, chave, df, metadados=None):
+        """Grava o snapshot de forma atômica (arquivo temporário + rename) e aplica o limite de tamanho."""
+        # O índice é preservado: resultados em cache (ex.: simulação) são alinhados por ele
+        tabela = pa.Table.from_pandas(df, preserve_index=True)
+        tabela = tabela.replace_schema_metadata({
+            **(tabela.schema.metadata or {}),
+            _CHAVE_METADADOS: json.dumps(metadados or {}, default=str).encode(),
+        })
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix='.tmp')
+        os.close(descritor)
+        try:
+            feather.write_feather(tabela, temporario, compression='uncompressed')
+            os.replace(temporario, self._caminho(chave))
+        except BaseException:
+            Path(temporario).unlink(missing_ok=True)
+            raise
+        self.despejar(manter=chave)
+
+    def snapshots(self):
+        """Lista (caminho, bytes, último acesso) dos snapshots, do mais recente ao mais antigo."""
+        itens = []
+        for caminho in self.pasta.glob(f'*{EXTENSAO}'):
+            try:
+                estado = caminho.stat()
+            except FileNotFoundError:
+                continue
+            itens.append((caminho, estado.st_size, estado.st_mtime))
+        return sorted(itens, key=lambda item: item[2], reverse=True)
+
+    def tamanho_total(self):
+        return sum(tamanho for _, tamanho, _ in self.snapshots())
+
+    def despejar(self, manter=None):
+        """Remove os snapshots usados há mais tempo até o total caber no limite. Retorna quantos removeu."""
+        total = 0
+        removidos = 0
+        for caminho, tamanho, _ in self.snapshots():
+            total += tamanho
+            if total > self.limite_bytes and caminho.stem != manter:
+                caminho.unlink(missing_ok=True)
+                total -= tamanho
+                removidos += 1
+        return removidos
+
+    def limpar(self):
+        for caminho, _, _ in self.snapshots():
+            caminho.unlink(missing_ok=True)
@@ -0,0 +1,82 @@
+"""Cronometragem por etapa, com variação de memória e logs estruturados (JSON por linha).
+
+Uso:
+    diag = Diagnostico(contexto={'arquivo': hash_arquivo})
+    with diag.etapa('ingestao', linhas=len(df)):
+        ...
+    diag.tabela()  # DataFrame com uma linha por etapa
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+try:
+    _TAMANHO_PAGINA = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _TAMANHO_PAGINA = None
+
+
+def memoria_rss():
+    """Memória residente do processo em bytes, ou None se a plataforma não expõe /proc."""
+    if _TAMANHO_PAGINA is None:
+        return None
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _TAMANHO_PAGINA
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def configurar_log(nivel=logging.INFO):
+    """Envia os registros de diagnóstico para stderr, caso a aplicação ainda não tenha configurado um handler."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(nivel)
+
+
+class Diagnostico:
+    def __init__(self, contexto=None):
+        self.contexto = dict(contexto or {})
+        self.registros = []
+
+    @contextmanager
+    def etapa(self, nome, **detalhes):
+        memoria_inicio = memoria_rss()
+        inicio = time.perf_counter()
+        try:
+            yield detalhes
+        finally:
+            segundos = time.perf_counter() - inicio
+            memoria_fim = memoria_rss()
+            registro = {
+                'etapa': nome,
+                'segundos': round(segundos, 6),
+                'memoria_delta_mb': (round((memoria_fim - memoria_inicio) / 1024 ** 2, 3)
+                                     if memoria_inicio is not None and memoria_fim is not None else None),
+                'memoria_mb': round(memoria_fim / 1024 ** 2, 1) if memoria_fim is not None else None,
+                **detalhes,
+            }
+            self.registros.append(registro)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({**self.contexto, **registro}, default=str))
+
+    def tabela(self):
+        colunas = ['etapa', 'segundos', 'memoria_delta_mb', 'memoria_mb']
+        df = pd.DataFrame(self.registros)
+        if df.empty:
+            return pd.DataFrame(columns=colunas)
+        extras = [c for c in df.columns if c not in colunas]
+        return df[colunas + extras]
+
+    def total_segundos(self):
+        return sum(r['segundos'] for r in self.registros)
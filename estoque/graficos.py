@@ -0,0 +1,82 @@
+"""Gráficos que escalam com o tamanho do catálogo.
+
+Acima de certos limites de linhas, os gráficos por produto trocam de representação para não enviar
+centenas de milhares de pontos ao navegador: a dispersão passa para WebGL (scattergl) e depois para
+um mapa de densidade; o treemap agrupa a cauda longa de cada classe ABC em um nó "Outros".
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from estoque import rede
+
+
+CORES_ABC = {'A': '#4CAF50', 'B': '#FFC107', 'C': '#F44336'}
+
+# Até LIMITE_SVG pontos a dispersão usa SVG (com bolhas); até LIMITE_WEBGL, scattergl; acima, densidade.
+LIMITE_SVG = 5_000
+LIMITE_WEBGL = 100_000
+BINS_DENSIDADE = 60
+
+# Produtos exibidos individualmente por classe no treemap
+PRODUTOS_POR_CLASSE_TREEMAP = 50
+
+
+def _linha_previsao_perfeita(fig, df):
+    max_val = max(df['real'].max(), df['previsto'].max()) * 1.05
+    fig.add_shape(type='line', x0=0, y0=0, x1=max_val, y1=max_val, line=dict(color='gray', dash='dash'))
+    return fig
+
+
+def dispersao_previsto_real(df, limite_svg=LIMITE_SVG, limite_webgl=LIMITE_WEBGL):
+    """Dispersão Previsto vs. Real. Retorna (figura, modo), com modo 'svg', 'webgl' ou 'densidade'."""
+    labels = {'real': 'Valor Real', 'previsto': 'Valor Previsto'}
+    if len(df) > limite_webgl:
+        # Contagens calculadas no servidor: apenas a grade de BINS_DENSIDADE² células vai ao navegador
+        real = df['real'].to_numpy(dtype='float64')
+        previsto = df['previsto'].to_numpy(dtype='float64')
+        validos = np.isfinite(real) & np.isfinite(previsto)
+        contagem, bordas_x, bordas_y = np.histogram2d(real[validos], previsto[validos], bins=BINS_DENSIDADE)
+        fig = go.Figure(go.Heatmap(
+            x=(bordas_x[:-1] + bordas_x[1:]) / 2, y=(bordas_y[:-1] + bordas_y[1:]) / 2,
+            z=np.where(contagem > 0, contagem, np.nan).T, colorscale='Blues', colorbar=dict(title='Produtos'),
+        ))
+        fig.update_layout(xaxis_title=labels['real'], yaxis_title=labels['previsto'])
+        return _linha_previsao_perfeita(fig, df), 'densidade'
+
+    dados = df[['produto', 'real', 'previsto', 'Curva_ABC', 'prejuizo']].assign(produto=lambda d: d['produto'].astype(str))
+    if len(df) > limite_svg:
+        # Sem tamanho de bolha: em WebGL milhares de bolhas sobrepostas só escondem os pontos
+        fig = px.scatter(dados, x='real', y='previsto', color='Curva_ABC', hover_name='produto',
+                         labels=labels, color_discrete_map=CORES_ABC, render_mode='webgl')
+        return _linha_previsao_perfeita(fig, df), 'webgl'
+
+    fig = px.scatter(dados, x='real', y='previsto', color='Curva_ABC', size='prejuizo', hover_name='produto',
+                     labels=labels, color_discrete_map=CORES_ABC)
+    return _linha_previsao_perfeita(fig, df), 'svg'
+
+
+def agrupar_cauda_treemap(df, produtos_por_classe=PRODUTOS_POR_CLASSE_TREEMAP):
+    """Mantém os maiores prejuízos de cada classe ABC e soma os demais em um nó 'Outros (n produtos)'."""
+    posicao = df.groupby('Curva_ABC', sort=False)['prejuizo'].rank(method='first', ascending=False)
+    principais = posicao <= produtos_por_classe
+
+    topo = pd.DataFrame({
+        'Curva_ABC': df.loc[principais, 'Curva_ABC'].to_numpy(),
+        'produto': rede.rotulo(df.loc[principais]).to_numpy(),
+        'prejuizo': df.loc[principais, 'prejuizo'].to_numpy(),
+    })
+    cauda = df.loc[~principais].groupby('Curva_ABC', sort=False)['prejuizo'].agg(['sum', 'size']).reset_index()
+    outros = pd.DataFrame({
+        'Curva_ABC': cauda['Curva_ABC'].to_numpy(),
+        'produto': [f"Outros {classe} ({n:,} produtos)" for classe, n in zip(cauda['Curva_ABC'], cauda['size'])],
+        'prejuizo': cauda['sum'].to_numpy(),
+    })
+    return pd.concat([topo, outros], ignore_index=True)
+
+
+def treemap_prejuizo(df, produtos_por_classe=PRODUTOS_POR_CLASSE_TREEMAP):
+    dados = agrupar_cauda_treemap(df, produtos_por_classe)
+    return px.treemap(dados, path=[px.Constant("Todos"), 'Curva_ABC', 'produto'], values='prejuizo',
+                      color='Curva_ABC', color_discrete_map={'(?)': '#262730', **CORES_ABC})
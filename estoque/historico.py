@@ -0,0 +1,256 @@
+"""Entrada em formato longo: histórico diário por produto (`produto`, `data`, `real`, `previsto`, ...).
+
+O histórico é lido em blocos e reduzido a somas por produto (ou por produto e `local`) (Σx, Σx², datas, último valor de cada
+atributo), de modo que a memória usada cresce com o número de produtos e não com o de linhas. As vendas
+de um dia são totalizadas antes de Σx², mesmo quando o dia se divide entre blocos (arquivos fora de
+ordem de data guardam os totais diários até o fim).
+O resultado tem uma linha por produto no mesmo formato do CSV tradicional, pronto para o motor.
+"""
+import numpy as np
+import pandas as pd
+
+from estoque import ingestao
+
+
+COLUNAS_OBRIGATORIAS_HISTORICO = {'produto', 'data', 'real', 'previsto', 'valor_unitario'}
+
+# Atributos do produto: vale o último valor informado (pela data)
+COLUNAS_ATRIBUTOS = ['valor_unitario', 'lead_time_dias', 'estoque', 'moq', 'lote_multiplo']
+
+ESQUEMA_HISTORICO = {**ingestao.ESQUEMA_LEITURA, 'lead_time_observado': 'float32'}
+
+SOMAS = ['soma_real', 'soma_real_quad', 'soma_previsto', 'n_lead_time', 'soma_lead_time', 'soma_lead_time_quad']
+
+
+# --- ACUMULAÇÃO POR BLOCO ---
+class _ForaDeOrdem(Exception):
+    """Um dia já dado como completo reapareceu num bloco posterior (arquivo fora de ordem de data)."""
+
+
+def _totais_diarios(bloco):
+    """Vendas do mesmo produto (e local) no mesmo dia somadas, indexadas por (chave..., data)."""
+    chave = ingestao.chaves(bloco.columns)
+    valores = bloco[chave + ['data']].assign(real=bloco['real'].astype('float64'),
+                                              previsto=bloco['previsto'].astype('float64'))
+    return valores.groupby(chave + ['data'], sort=False)[['real', 'previsto']].sum()
+
+
+def _somar_diarios(parciais):
+    df = pd.concat(parciais)
+    if df.index.is_unique:
+        return df
+    return df.groupby(level=list(df.index.names), sort=False).sum()
+
+
+def _acumular_dias(diario):
+    """Somas por produto a partir de totais diários completos (nenhum bloco seguinte traz esses dias).
+
+    Σx² só pode ser acumulado sobre o total do dia: um dia dividido entre blocos daria Σ(a² + b²)
+    em vez de Σ(a + b)².
+    """
+    chave = [nome for nome in diario.index.names if nome != 'data']
+    dias = diario.reset_index()
+    return dias.assign(real_quad=dias['real'] ** 2).groupby(chave, sort=False).agg(
+        soma_real=('real', 'sum'),
+        soma_real_quad=('real_quad', 'sum'),
+        soma_previsto=('previsto', 'sum'),
+        data_inicio=('data', 'min'),
+    )
+
+
+def _acumular_atributos(bloco):
+    """Último valor de cada atributo (pela data) e somas do lead time observado, por produto."""
+    chave = ingestao.chaves(bloco.columns)
+    ordenado = bloco.sort_values('data', kind='stable').groupby(chave, sort=False)
+    atributos = [c for c in COLUNAS_ATRIBUTOS if c in bloco.columns]
+    acc = ordenado[atributos].last()
+    acc['data_atributos'] = ordenado['data'].max()
+
+    if 'lead_time_observado' in bloco.columns:
+        lt = bloco['lead_time_observado'].astype('float64')
+        g_lt = bloco[chave].assign(lt=lt, lt_quad=lt ** 2).groupby(chave, sort=False)
+        acc['n_lead_time'] = g_lt['lt'].count()
+        acc['soma_lead_time'] = g_lt['lt'].sum()
+        acc['soma_lead_time_quad'] = g_lt['lt_quad'].sum()
+    return acc
+
+
+def _combinar(parciais):
+    df = pd.concat(parciais)
+    if df.index.is_unique:
+        return df
+    niveis = list(df.index.names)
+    g = df.groupby(level=niveis, sort=False)
+    somas = [c for c in SOMAS if c in df.columns]
+    acc = g[somas].sum()
+    if 'data_inicio' in df.columns:
+        acc['data_inicio'] = g['data_inicio'].min()
+
+    if 'data_atributos' in df.columns:
+        atributos = [c for c in COLUNAS_ATRIBUTOS if c in df.columns] + ['data_atributos']
+        recentes = df.sort_values('data_atributos', kind='stable').groupby(level=niveis, sort=False)[atributos].last()
+        acc[atributos] = recentes.reindex(acc.index)
+    return acc
+
+
+def _juntar(acc, parcial):
+    return parcial if acc is None else _combinar([acc, parcial])
+
+
+# --- ESTATÍSTICAS FINAIS ---
+def _desvio_amostral(n, soma, soma_quad):
+    """Desvio padrão amostral a partir de n, Σx e Σx² (0 quando há menos de duas observações)."""
+    n = np.asarray(n, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variancia = (soma_quad - soma ** 2 / n) / (n - 1)
+    return np.sqrt(np.where(n > 1, np.clip(variancia, 0, None), 0.0))
+
+
+def _preencher_lead_time(df):
+    """Lead time dos produtos sem lead time observado nem declarado: média dos lead times conhecidos
+    no mesmo local (ou de todo o arquivo) e, como σLT, o desvio padrão entre eles.
+
+    Sem isso o ROP desses produtos seria NaN e o status sairia 'OK' mesmo com estoque zerado.
+    Levanta ValueError se nenhum produto tiver lead time.
+    """
+    lead_time = df['lead_time_dias']
+    faltantes = lead_time.isna().to_numpy()
+    if not faltantes.any():
+        return df
+    if faltantes.all():
+        raise ValueError("Nenhum produto do histórico tem lead time ('lead_time_dias' ou 'lead_time_observado').")
+    media, desvio = lead_time.mean(), lead_time.std()
+    if 'local' in df.columns:
+        por_local = lead_time.groupby(df['local'], sort=False)
+        media = por_local.transform('mean').fillna(media)
+        desvio = por_local.transform('std').fillna(desvio)
+    df['lead_time_dias'] = lead_time.fillna(media)
+    if 'desvio_padrao_lead_time' in df.columns:
+        desvio = desvio.fillna(0) if isinstance(desvio, pd.Series) else np.nan_to_num(desvio)
+        df['desvio_padrao_lead_time'] = df['desvio_padrao_lead_time'].where(~faltantes, desvio)
+    return df
+
+
+def _finalizar(acc, dias_no_periodo, data_inicial, data_final):
+    # Dias sem registro contam como demanda zero, da primeira venda do produto (ou de `data_inicial`,
+    # o início da janela) até a última data do arquivo: produtos que pararam de vender não ficam
+    # com a demanda de quando vendiam.
+    inicio = acc['data_inicio'] if data_inicial is None else pd.Series(data_inicial, index=acc.index)
+    dias = ((data_final - inicio).dt.days + 1).to_numpy(dtype='float64')
+    media_diaria = acc['soma_real'].to_numpy() / dias
+
+    df = acc.index.to_frame(index=False).assign(**{
+        'real': media_diaria * dias_no_periodo,
+        'previsto': acc['soma_previsto'].to_numpy() / dias * dias_no_periodo,
+        'desvio_padrao_demanda_diaria': _desvio_amostral(dias, acc['soma_real'].to_numpy(), acc['soma_real_quad'].to_numpy()),
+    })
+    for coluna in COLUNAS_ATRIBUTOS:
+        if coluna in acc.columns:
+            df[coluna] = acc[coluna].to_numpy()
+
+    if 'n_lead_time' in acc.columns:
+        n_lt = acc['n_lead_time'].to_numpy(dtype='float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media_lt = acc['soma_lead_time'].to_numpy() / n_lt
+        df['desvio_padrao_lead_time'] = _desvio_amostral(n_lt, acc['soma_lead_time'].to_numpy(), acc['soma_lead_time_quad'].to_numpy())
+        # O lead time médio observado tem prioridade sobre o declarado
+        declarado = df['lead_time_dias'].to_numpy() if 'lead_time_dias' in df.columns else np.nan
+        df['lead_time_dias'] = np.where(n_lt > 0, media_lt, declarado)
+
+    if 'lead_time_dias' not in df.columns:
+        raise ingestao.ColunasFaltantesError({'lead_time_dias'})
+    return ingestao.compactar(_preencher_lead_time(df))
+
+
+def validar_cabecalho(arquivo, obrigatorias=COLUNAS_OBRIGATORIAS_HISTORICO):
+    """Confere as colunas obrigatórias pelo cabeçalho, antes de a leitura converter a coluna `data`.
+
+    Sem isso, um arquivo sem `data` falharia no `parse_dates` do pandas e não com ColunasFaltantesError.
+    Retorna as colunas do cabeçalho (já com os sinônimos normalizados).
+    """
+    cabecalho = ingestao.normalizar_colunas(pd.read_csv(arquivo, nrows=0))
+    arquivo.seek(0)
+    ingestao.validar_bloco(cabecalho, None, obrigatorias)
+    return cabecalho.columns
+
+
+def _limites_datas(arquivo, tamanho_bloco):
+    """Primeira e última data do arquivo inteiro (antes de qualquer filtro de janela)."""
+    inicio = fim = None
+    for bloco in pd.read_csv(arquivo, usecols=['data'], parse_dates=['data'], chunksize=tamanho_bloco):
+        inicio_bloco, fim_bloco = bloco['data'].min(), bloco['data'].max()
+        if pd.isna(inicio_bloco):
+            continue
+        inicio = inicio_bloco if inicio is None else min(inicio, inicio_bloco)
+        fim = fim_bloco if fim is None else max(fim, fim_bloco)
+    arquivo.seek(0)
+    if fim is None:
+        raise ValueError("O histórico não contém linhas de dados.")
+    return inicio, fim
+
+
+def _ler_blocos(arquivo, tamanho_bloco, inicio_janela, fechar_dias):
+    """Acumula o arquivo bloco a bloco. Retorna (somas por produto, última data lida).
+
+    Com `fechar_dias`, supõe o arquivo em ordem de data: os dias anteriores ao último dia lido estão
+    completos e viram somas por produto, e só o último dia fica pendente para o bloco seguinte.
+    Se um bloco trouxer um dia anterior, levanta _ForaDeOrdem. Sem `fechar_dias`, os totais diários
+    de todos os dias ficam pendentes até o fim.
+    """
+    acc_dias = acc_atributos = pendente = data_final = None
+    leitor = pd.read_csv(arquivo, dtype=ESQUEMA_HISTORICO, parse_dates=['data'], chunksize=tamanho_bloco)
+    for numero, bloco in enumerate(leitor, start=1):
+        bloco = ingestao.normalizar_colunas(bloco)
+        ingestao.validar_bloco(bloco, numero, COLUNAS_OBRIGATORIAS_HISTORICO)
+        if inicio_janela is not None:
+            bloco = bloco[bloco['data'] >= inicio_janela]
+        bloco = bloco[bloco['data'].notna()]
+        if bloco.empty:
+            continue
+
+        inicio_bloco, fim_bloco = bloco['data'].min(), bloco['data'].max()
+        if fechar_dias and data_final is not None and inicio_bloco < data_final:
+            raise _ForaDeOrdem
+        data_final = fim_bloco if data_final is None else max(data_final, fim_bloco)
+
+        diario = _totais_diarios(bloco)
+        pendente = diario if pendente is None else _somar_diarios([pendente, diario])
+        if fechar_dias:
+            completos = pendente.index.get_level_values('data') < data_final
+            acc_dias = _juntar(acc_dias, _acumular_dias(pendente[completos]))
+            pendente = pendente[~completos]
+        acc_atributos = _juntar(acc_atributos, _acumular_atributos(bloco))
+
+    if pendente is None:
+        raise ValueError("O histórico não contém linhas de dados no período selecionado.")
+    acc_dias = _juntar(acc_dias, _acumular_dias(pendente))
+    return acc_dias.join(acc_atributos), data_final
+
+
+def ler_historico(arquivo, dias_no_periodo, janela_dias=None, tamanho_bloco=ingestao.TAMANHO_BLOCO_PADRAO):
+    """Lê o histórico diário e devolve uma linha por produto (ou produto e local) com demanda média e desvios.
+
+    `real` e `previsto` saem como média por período (média diária × `dias_no_periodo`), para que o
+    motor recupere a demanda diária média. Com `janela_dias`, só entram os últimos N dias anteriores
+    à data mais recente do arquivo (uma leitura extra apenas da coluna `data`), e todos os produtos
+    contam desde o início da janela, mesmo que ninguém tenha vendido nos primeiros dias dela.
+    `lead_time_observado` (opcional) gera o desvio padrão do lead time.
+
+    Em arquivos ordenados por data, só os totais do último dia lido ficam em memória além das somas
+    por produto. Fora de ordem, o arquivo é relido guardando os totais diários até o fim.
+    """
+    if not {'lead_time_dias', 'lead_time_observado'} & set(validar_cabecalho(arquivo)):
+        raise ingestao.ColunasFaltantesError({'lead_time_dias'})
+    inicio_janela = data_inicial = None
+    if janela_dias:
+        inicio_arquivo, fim_arquivo = _limites_datas(arquivo, tamanho_bloco)
+        inicio_janela = fim_arquivo - pd.Timedelta(days=janela_dias - 1)
+        # Todos os produtos contam desde o início da janela (ou do arquivo, se ele for mais curto)
+        data_inicial = max(inicio_janela, inicio_arquivo)
+
+    try:
+        acc, data_final = _ler_blocos(arquivo, tamanho_bloco, inicio_janela, fechar_dias=True)
+    except _ForaDeOrdem:
+        arquivo.seek(0)
+        acc, data_final = _ler_blocos(arquivo, tamanho_bloco, inicio_janela, fechar_dias=False)
+    return _finalizar(acc, dias_no_periodo, data_inicial, data_final)
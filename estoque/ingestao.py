@@ -0,0 +1,172 @@
+"""Leitura do CSV em blocos, com esquema de tipos compacto e agregação por produto (ou produto e local)."""
+import numpy as np
+import pandas as pd
+
+
+COLUNAS_OBRIGATORIAS = {'produto', 'real', 'previsto', 'valor_unitario', 'lead_time_dias'}
+
+# Esquema declarado: quantidades em float32 (aceitam NaN e valores fracionados); valores monetários
+# continuam em float64 para não perder precisão nas somas de prejuízo e consumo.
+ESQUEMA = {
+    'produto': 'str',
+    'local': 'str',
+    'real': 'float32',
+    'previsto': 'float32',
+    'valor_unitario': 'float64',
+    'lead_time_dias': 'float32',
+    'estoque': 'float32',
+    'desvio_padrao_demanda_diaria': 'float32',
+    'desvio_padrao_lead_time': 'float32',
+    'moq': 'float32',
+    'lote_multiplo': 'float32',
+}
+
+# Como cada coluna é combinada quando um produto aparece em mais de uma linha (ou bloco):
+# - quantidades movimentadas são somadas;
+# - desvios padrão da demanda de linhas independentes (ex.: um arquivo por local) viram √Σσ²;
+# - preço e lead time viram médias ponderadas pela demanda (Σ real × valor_unitario se mantém);
+# - os demais atributos (moq, lote_multiplo) ficam com a primeira ocorrência.
+COLUNAS_SOMADAS = ['real', 'previsto', 'estoque']
+COLUNAS_QUADRATICAS = ['desvio_padrao_demanda_diaria']
+COLUNAS_PONDERADAS = ['valor_unitario', 'lead_time_dias', 'desvio_padrao_lead_time']
+
+# Somas parciais de cada coluna ponderada: Σ peso·x e Σ peso, mais Σ x e n para quando a demanda
+# do produto é toda zero (média simples)
+SUFIXOS_PONDERADOS = ['__soma_ponderada', '__soma_pesos', '__soma', '__n']
+
+# Coluna opcional de local de estoque (CD, loja, depósito); 'deposito' é aceito como sinônimo.
+# Com ela, cada linha do resultado é um par (produto, local) em vez de um produto.
+SINONIMOS = {'deposito': 'local'}
+
+ESQUEMA_LEITURA = {**ESQUEMA, **{sinonimo: ESQUEMA[coluna] for sinonimo, coluna in SINONIMOS.items()}}
+
+TAMANHO_BLOCO_PADRAO = 500_000
+
+
+class ColunasFaltantesError(ValueError):
+    def __init__(self, colunas, bloco=None):
+        self.colunas = set(colunas)
+        self.bloco = bloco
+        onde = f" (bloco {bloco})" if bloco is not None else ""
+        super().__init__(f"Colunas obrigatórias ausentes{onde}: {', '.join(sorted(self.colunas))}")
+
+
+def chaves(colunas):
+    """Colunas que identificam uma linha do resultado: ['produto'] ou ['produto', 'local']."""
+    return ['produto', 'local'] if 'local' in colunas else ['produto']
+
+
+def normalizar_colunas(bloco):
+    return bloco.rename(columns=SINONIMOS) if any(c in bloco.columns for c in SINONIMOS) else bloco
+
+
+def validar_bloco(bloco, numero, obrigatorias=COLUNAS_OBRIGATORIAS):
+    """Confere as colunas obrigatórias e que nenhuma linha está sem produto (ou local), que o
+    agrupamento descartaria sem aviso."""
+    faltantes = obrigatorias - set(bloco.columns)
+    if faltantes:
+        raise ColunasFaltantesError(faltantes, numero)
+    for coluna in chaves(bloco.columns):
+        vazias = int(bloco[coluna].isna().sum()) if coluna in bloco.columns else 0
+        if vazias:
+            onde = f" no bloco {numero}" if numero is not None else ""
+            raise ValueError(f"{vazias:,} linha(s) sem '{coluna}'{onde}. Preencha ou remova essas linhas.")
+
+
+def _somas_parciais(df):
+    """Troca as colunas combinadas por somas, que se recombinam entre blocos somando de novo."""
+    partes = {}
+    peso = df['real'].astype('float64').clip(lower=0).fillna(0)
+    for coluna in df.columns:
+        if coluna in COLUNAS_QUADRATICAS:
+            partes[coluna] = df[coluna].astype('float64') ** 2
+        elif coluna in COLUNAS_PONDERADAS:
+            valores = df[coluna].astype('float64')
+            informado = valores.notna()
+            somas = [peso * valores, peso.where(informado, 0), valores, informado.astype('float64')]
+            for sufixo, soma in zip(SUFIXOS_PONDERADOS, somas):
+                partes[coluna + sufixo] = soma.where(informado, 0)
+        else:
+            partes[coluna] = df[coluna]
+    return pd.DataFrame(partes, index=df.index)
+
+
+def _agregar(agrupado, colunas):
+    """Soma as colunas somadas, quadráticas e ponderadas (NaN se todas faltarem) e mantém a primeira
+    ocorrência dos demais atributos. Aplicado às somas parciais, tanto por bloco quanto entre blocos."""
+    colunas = [c for c in colunas if c not in ('produto', 'local')]
+    primeiras = [c for c in colunas if c not in COLUNAS_SOMADAS + COLUNAS_QUADRATICAS
+                 and not c.endswith(tuple(SUFIXOS_PONDERADOS))]
+    somadas = [c for c in colunas if c not in primeiras]
+    partes = []
+    if somadas:
+        partes.append(agrupado[somadas].sum(min_count=1))
+    if primeiras:
+        partes.append(agrupado[primeiras].first())
+    return pd.concat(partes, axis=1)[colunas]
+
+
+def _agregar_por_chave(df):
+    df = _somas_parciais(df)
+    return _agregar(df.groupby(chaves(df.columns), sort=False), df.columns)
+
+
+def _finalizar_somas(df):
+    """Volta das somas parciais às colunas do esquema: √Σσ² e médias ponderadas pela demanda."""
+    for coluna in COLUNAS_QUADRATICAS:
+        if coluna in df.columns:
+            df[coluna] = np.sqrt(df[coluna])
+    for coluna in COLUNAS_PONDERADAS:
+        nomes = [coluna + sufixo for sufixo in SUFIXOS_PONDERADOS]
+        if nomes[0] not in df.columns:
+            continue
+        soma_ponderada, soma_pesos, soma, n = (df.pop(nome).to_numpy(dtype='float64') for nome in nomes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df[coluna] = np.where(soma_pesos > 0, soma_ponderada / soma_pesos, soma / n)
+    return df
+
+
+def compactar(df):
+    """Converte 'produto' (e 'local') para category e restaura os tipos do esquema após a agregação."""
+    chave = chaves(df.columns)
+    tipos = {c: t for c, t in ESQUEMA.items() if c in df.columns and c not in chave}
+    df = df.astype(tipos)
+    for coluna in chave:
+        df[coluna] = df[coluna].astype('category')
+    return df
+
+
+def ler_csv(arquivo, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+    """Lê o CSV aplicando o esquema e devolve uma linha por produto (ou por produto e local).
+
+    Com `tamanho_bloco`, o arquivo é lido e agregado bloco a bloco, de modo que apenas um bloco
+    bruto e os agregados parciais ficam em memória. Com `tamanho_bloco=None`, usa o engine
+    pyarrow (multi-thread) para ler o arquivo inteiro de uma vez.
+    """
+    if tamanho_bloco is None:
+        df = normalizar_colunas(pd.read_csv(arquivo, engine='pyarrow', dtype=ESQUEMA_LEITURA))
+        validar_bloco(df, None)
+        if not df.duplicated(chaves(df.columns)).any():
+            return compactar(df)
+        colunas = list(df.columns)
+        return compactar(_finalizar_somas(_agregar_por_chave(df).reset_index())[colunas])
+
+    parciais = []
+    for numero, bloco in enumerate(pd.read_csv(arquivo, dtype=ESQUEMA_LEITURA, chunksize=tamanho_bloco), start=1):
+        bloco = normalizar_colunas(bloco)
+        validar_bloco(bloco, numero)
+        colunas = bloco.columns
+        parciais.append(_agregar_por_chave(bloco))
+        del bloco
+
+    if not parciais:
+        raise ValueError("O arquivo não contém linhas de dados.")
+    colunas = list(colunas)
+    if len(parciais) == 1:
+        df = parciais[0]
+    else:
+        # Os agregados parciais são por chave; a recombinação mantém a ordem de primeira aparição.
+        df = pd.concat(parciais)
+        parciais.clear()
+        df = _agregar(df.groupby(level=list(df.index.names), sort=False), df.columns)
+    return compactar(_finalizar_somas(df.reset_index())[colunas])
@@ -0,0 +1,125 @@
+"""Processamento em lote, sem interface: aplica o motor a todos os CSVs de um diretório.
+
+Uso:
+    python -m estoque DIRETORIO --parametros parametros.json --saida resultados/ [--formato parquet]
+
+O arquivo de parâmetros (JSON ou TOML) traz os mesmos valores da barra lateral do app;
+chaves ausentes usam os valores padrão do app.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from estoque import historico, motor, rede
+
+
+FORMATOS_SAIDA = ('parquet', 'csv')
+
+
+def carregar_parametros(caminho):
+    parametros = dict(motor.PARAMETROS_PADRAO)
+    if caminho is None:
+        return parametros
+    caminho = Path(caminho)
+    with open(caminho, 'rb') as f:
+        lidos = tomllib.load(f) if caminho.suffix == '.toml' else json.load(f)
+
+    desconhecidos = set(lidos) - set(parametros)
+    if desconhecidos:
+        raise ValueError(f"Parâmetros desconhecidos em {caminho}: {', '.join(sorted(desconhecidos))}")
+    parametros.update(lidos)
+    if parametros['nivel_servico_z'] not in motor.Z_SCORES:
+        raise ValueError(f"nivel_servico_z deve ser um de {sorted(motor.Z_SCORES)}")
+    return parametros
+
+
+def processar_arquivo(caminho, parametros, pasta_saida, formato='parquet', formato_historico=False, janela_dias=None):
+    """Processa um CSV e grava a tabela detalhada. Retorna uma linha do relatório de tempos."""
+    relatorio = {'arquivo': Path(caminho).name, 'produtos': 0, 'saida': None, 'erro': None}
+    inicio = time.perf_counter()
+    try:
+        with open(caminho, 'rb') as arquivo:
+            if formato_historico:
+                df = historico.ler_historico(arquivo, parametros['dias_no_periodo'], janela_dias=janela_dias)
+            else:
+                df = motor.ler_csv(arquivo)
+        lido = time.perf_counter()
+
+        completo = motor.processar(df, **parametros)
+        resultado = completo[motor.colunas_para_exibir(completo)]
+        destino = Path(pasta_saida) / f"{Path(caminho).stem}.{formato}"
+        saidas = {destino: resultado}
+        # Com vários locais, grava também o consolidado por produto da rede em <arquivo>_rede
+        if rede.tem_locais(completo):
+            destino_rede = destino.with_name(f"{Path(caminho).stem}_rede.{formato}")
+            saidas[destino_rede] = rede.consolidar_por_produto(completo)[rede.COLUNAS_PRODUTO_PARA_EXIBIR]
+        del completo
+        calculado = time.perf_counter()
+
+        for caminho_saida, tabela in saidas.items():
+            if formato == 'parquet':
+                tabela.to_parquet(caminho_saida, index=False)
+            else:
+                tabela.to_csv(caminho_saida, index=False)
+        gravado = time.perf_counter()
+
+        relatorio.update(produtos=len(resultado), saida=str(destino), leitura_s=lido - inicio,
+                         calculo_s=calculado - lido, gravacao_s=gravado - calculado)
+    except Exception as e:
+        relatorio['erro'] = f"{type(e).__name__}: {e}"
+    relatorio['total_s'] = time.perf_counter() - inicio
+    return relatorio
+
+
+def processar_diretorio(diretorio, parametros, pasta_saida, formato='parquet', padrao='*.csv',
+                        processos=None, formato_historico=False, janela_dias=None):
+    arquivos = sorted(Path(diretorio).glob(padrao))
+    Path(pasta_saida).mkdir(parents=True, exist_ok=True)
+
+    relatorios = []
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        tarefas = [
+            executor.submit(processar_arquivo, caminho, parametros, pasta_saida, formato, formato_historico, janela_dias)
+            for caminho in arquivos
+        ]
+        for tarefa in as_completed(tarefas):
+            relatorio = tarefa.result()
+            relatorios.append(relatorio)
+            situacao = relatorio['erro'] or f"{relatorio['produtos']:,} produtos"
+            print(f"[{len(relatorios)}/{len(arquivos)}] {relatorio['arquivo']}: {relatorio['total_s']:.2f}s - {situacao}",
+                  file=sys.stderr)
+
+    colunas = ['arquivo', 'produtos', 'leitura_s', 'calculo_s', 'gravacao_s', 'total_s', 'saida', 'erro']
+    return pd.DataFrame(relatorios, columns=colunas).sort_values('arquivo', ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m estoque', description="Análise de estoque em lote para um diretório de CSVs.")
+    parser.add_argument('diretorio', help="Diretório com os arquivos CSV de entrada.")
+    parser.add_argument('--parametros', help="Arquivo JSON ou TOML com os parâmetros da barra lateral.")
+    parser.add_argument('--saida', required=True, help="Diretório onde as tabelas detalhadas serão gravadas.")
+    parser.add_argument('--formato', choices=FORMATOS_SAIDA, default='parquet')
+    parser.add_argument('--padrao', default='*.csv', help="Padrão glob dos arquivos de entrada (padrão: *.csv).")
+    parser.add_argument('--processos', type=int, default=None, help="Número de processos (padrão: número de CPUs).")
+    parser.add_argument('--historico', action='store_true', help="Os CSVs estão no formato de histórico diário.")
+    parser.add_argument('--janela-dias', type=int, default=None, help="Com --historico, usa apenas os últimos N dias.")
+    args = parser.parse_args(argv)
+
+    parametros = carregar_parametros(args.parametros)
+    relatorio = processar_diretorio(args.diretorio, parametros, args.saida, formato=args.formato, padrao=args.padrao,
+                                    processos=args.processos, formato_historico=args.historico,
+                                    janela_dias=args.janela_dias)
+    relatorio.to_csv(os.path.join(args.saida, 'relatorio_tempos.csv'), index=False)
+    print(relatorio.drop(columns='saida').to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    return 1 if relatorio['erro'].notna().any() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
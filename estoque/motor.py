@@ -0,0 +1,231 @@
+"""Motor de cálculo de acurácia e gestão de estoque, independente do Streamlit.
+
+Cada etapa recebe apenas os parâmetros de que depende, para que a interface
+possa memoizar as etapas separadamente.
+"""
+import pandas as pd
+import numpy as np
+
+from estoque import ingestao
+from estoque.ingestao import COLUNAS_OBRIGATORIAS
+
+# Mapeamento do Nível de Serviço para o Z-score
+Z_SCORES = {90: 1.28, 95: 1.65, 98: 2.05, 99: 2.33}
+
+# Valores padrão dos parâmetros da barra lateral
+PARAMETROS_PADRAO = {
+    'custo_pedido': 50.0,
+    'custo_manutencao_percentual': 20.0,
+    'moq_fornecedor': 1,
+    'lote_multiplo': 1,
+    'periodos_no_ano': 12,
+    'dias_no_periodo': 30,
+    'nivel_servico_z': 95,
+}
+
+# Valores de Status_Estoque (e do Status_Rede da visão consolidada)
+STATUS_PEDIR = 'PEDIR AGORA!'
+STATUS_OK = 'OK'
+STATUS_ESTOQUE = [STATUS_PEDIR, STATUS_OK]
+
+# Limites (em % do valor acumulado) das classes A e B da Curva ABC
+LIMITES_ABC = [80, 95]
+CLASSES_ABC = np.array(['A', 'B', 'C'])
+
+COLUNAS_PARA_EXIBIR = [
+    'produto', 'Curva_ABC', 'real', 'previsto', 'erro_absoluto', 'prejuizo',
+    'estoque_seguranca', 'Ponto_de_Pedido', 'LEC_EOQ', 'Pedido_Recomendado', 'estoque', 'Status_Estoque'
+]
+
+
+def colunas_para_exibir(df):
+    """COLUNAS_PARA_EXIBIR, com 'local' logo após 'produto' quando o arquivo tem vários locais."""
+    if 'local' not in df.columns:
+        return COLUNAS_PARA_EXIBIR
+    return ['produto', 'local'] + COLUNAS_PARA_EXIBIR[1:]
+
+
+# --- LEITURA E VALIDAÇÃO ---
+def ler_csv(arquivo, tamanho_bloco=ingestao.TAMANHO_BLOCO_PADRAO):
+    return ingestao.ler_csv(arquivo, tamanho_bloco=tamanho_bloco)
+
+
+def colunas_faltantes(df):
+    return COLUNAS_OBRIGATORIAS - set(df.columns)
+
+
+def garantir_estoque(df):
+    """Define 'estoque' como 0 se a coluna não existir. Retorna (df, tinha_estoque)."""
+    if 'estoque' in df.columns:
+        return df, True
+    return df.assign(estoque=0), False
+
+
+# --- CÁLCULOS DE ACURÁCIA ---
+def calcular_acuracia(df):
+    erro_absoluto = (df['real'] - df['previsto']).abs()
+    return df.assign(
+        erro_absoluto=erro_absoluto,
+        bias_individual=df['previsto'] - df['real'],
+        prejuizo=erro_absoluto * df['valor_unitario'],
+    )
+
+
+# --- CÁLCULO DA CURVA ABC ---
+def classificar_abc(percentual):
+    """Classifica um array de percentuais acumulados: <= 80 é A, <= 95 é B e o resto (inclusive NaN) é C."""
+    return CLASSES_ABC[np.digitize(percentual, LIMITES_ABC, right=True)]
+
+
+def ordenar_por_consumo(df):
+    df = df.assign(valor_consumo=df['real'] * df['valor_unitario'])
+    return df.sort_values(by='valor_consumo', ascending=False, kind='stable')
+
+
+def classificar_curva_abc(df):
+    """Acumula o consumo e classifica. `df` já deve estar ordenado por valor_consumo decrescente.
+
+    Qualquer subconjunto de linhas de um DataFrame ordenado continua ordenado, então uma seleção
+    de produtos pode ser reclassificada sem ordenar de novo.
+    """
+    valor_acumulado = df['valor_consumo'].cumsum()
+    valor_total_consumo = df['valor_consumo'].sum()
+    percentual_acumulado = (valor_acumulado / valor_total_consumo) * 100
+    return df.assign(
+        valor_acumulado=valor_acumulado,
+        percentual_acumulado=percentual_acumulado,
+        Curva_ABC=classificar_abc(percentual_acumulado.to_numpy()),
+    )
+
+
+def calcular_curva_abc(df):
+    return classificar_curva_abc(ordenar_por_consumo(df))
+
+
+# --- LOTE ECONÔMICO E PEDIDO RECOMENDADO ---
+def parametro_por_produto(df, coluna, padrao, minimo):
+    """Valores da coluna opcional por produto; ausentes ou abaixo do mínimo usam o padrão global."""
+    if coluna not in df.columns:
+        return np.full(len(df), padrao, dtype='float64')
+    valores = pd.to_numeric(df[coluna], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    return np.where(valores >= minimo, valores, padrao)
+
+
+def calcular_pedido(df, custo_pedido, custo_manutencao_percentual, moq_fornecedor, lote_multiplo, periodos_no_ano):
+    """Retorna apenas as colunas derivadas de LEC/EOQ e do pedido recomendado."""
+    res = pd.DataFrame(index=df.index)
+    res['demanda_anual'] = df['real'] * periodos_no_ano
+    res['custo_manutencao_unidade'] = df['valor_unitario'] * (custo_manutencao_percentual / 100)
+    if custo_manutencao_percentual > 0:
+        numerador = 2 * res['demanda_anual'] * custo_pedido
+        denominador = res['custo_manutencao_unidade']
+        # Evitar divisão por zero ou raiz de número negativo
+        res['LEC_EOQ'] = np.sqrt(numerador / denominador.replace(0, np.nan)).fillna(0).round(0)
+    else:
+        res['LEC_EOQ'] = np.inf
+
+    # Pedido Recomendado (Ajustado para MOQ e Lote Múltiplo), com valores por produto quando o CSV os traz
+    moq = parametro_por_produto(df, 'moq', moq_fornecedor, minimo=0)
+    lote = parametro_por_produto(df, 'lote_multiplo', lote_multiplo, minimo=1)
+    res['Pedido_Ajustado_MOQ'] = np.maximum(res['LEC_EOQ'].to_numpy(), moq)
+    res['Pedido_Recomendado'] = np.ceil(res['Pedido_Ajustado_MOQ'] / lote) * lote
+    return res
+
+
+# --- PONTO DE PEDIDO E ESTOQUE DE SEGURANÇA ---
+def formula_estoque_seguranca(colunas):
+    """Indica qual fórmula de SS as colunas disponíveis permitem: 'avancada', 'padrao' ou 'simplificada'."""
+    if 'desvio_padrao_demanda_diaria' in colunas and 'desvio_padrao_lead_time' in colunas:
+        return 'avancada'
+    elif 'desvio_padrao_demanda_diaria' in colunas:
+        return 'padrao'
+    return 'simplificada'
+
+
+def calcular_ponto_pedido(df, z_score, dias_no_periodo):
+    """Retorna apenas as colunas derivadas de SS, ROP e Status_Estoque."""
+    res = pd.DataFrame(index=df.index)
+    res['demanda_diaria_media'] = df['real'] / dias_no_periodo
+
+    formula = formula_estoque_seguranca(df.columns)
+    if formula == 'avancada':
+        variancia_demanda = df['lead_time_dias'] * (df['desvio_padrao_demanda_diaria'] ** 2)
+        variancia_lead_time = (res['demanda_diaria_media'] ** 2) * (df['desvio_padrao_lead_time'] ** 2)
+        res['estoque_seguranca'] = z_score * np.sqrt(variancia_demanda + variancia_lead_time)
+    elif formula == 'padrao':
+        res['estoque_seguranca'] = z_score * df['desvio_padrao_demanda_diaria'] * np.sqrt(df['lead_time_dias'])
+    else:
+        # Fórmula original (menos precisa) como fallback
+        res['estoque_seguranca'] = z_score * res['demanda_diaria_media'] * np.sqrt(df['lead_time_dias'])
+
+    # Ponto de Pedido (ROP)
+    res['Ponto_de_Pedido'] = ((res['demanda_diaria_media'] * df['lead_time_dias']) + res['estoque_seguranca']).round(0)
+
+    # Alerta de Ressuprimento
+    res['Status_Estoque'] = np.where(df['estoque'] <= res['Ponto_de_Pedido'], STATUS_PEDIR, STATUS_OK)
+    return res
+
+
+# --- SELEÇÃO DE PRODUTOS ---
+def mascara_texto(serie, texto, contem=False):
+    """Máscara dos valores que começam com `texto` (ou o contêm, com `contem`), sem distinguir maiúsculas."""
+    texto = texto.lower()
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Compara apenas as categorias distintas e indexa pelos códigos
+        categorias = serie.cat.categories.str.lower()
+        categorias = categorias.str.contains(texto, regex=False) if contem else categorias.str.startswith(texto)
+        codigos = serie.cat.codes.to_numpy()
+        return (codigos >= 0) & np.asarray(categorias, dtype=bool)[codigos]
+    valores = serie.astype(str).str.lower()
+    valores = valores.str.contains(texto, regex=False) if contem else valores.str.startswith(texto)
+    return valores.to_numpy(dtype=bool)
+
+
+def mascara_selecao(df, classes=None, status=None, prefixo='', locais=None):
+    """Máscara booleana dos produtos por classe ABC, status de estoque, prefixo do nome (sem distinguir maiúsculas) e local."""
+    mascara = np.ones(len(df), dtype=bool)
+    if locais:
+        mascara &= df['local'].isin(locais).to_numpy()
+    if classes:
+        mascara &= df['Curva_ABC'].isin(classes).to_numpy()
+    if status:
+        mascara &= df['Status_Estoque'].isin(status).to_numpy()
+    if prefixo:
+        mascara &= mascara_texto(df['produto'], prefixo)
+    return mascara
+
+
+# --- MÉTRICAS GERAIS ---
+def calcular_indicadores(df):
+    """Indicadores agregados de acurácia e estoque de uma seleção de produtos."""
+    erro_absoluto = df['erro_absoluto'].to_numpy(dtype='float64')
+    real = df['real'].to_numpy(dtype='float64')
+    valor_unitario = df['valor_unitario'].to_numpy(dtype='float64')
+
+    soma_erro = np.nansum(erro_absoluto)
+    soma_real = np.nansum(np.abs(real))
+    wmape = (soma_erro / soma_real) * 100 if soma_real != 0 else 0
+
+    # Giro de Estoque
+    valor_vendas_total = np.nansum(real * valor_unitario)
+    valor_estoque_total = np.nansum(df['estoque'].to_numpy(dtype='float64') * valor_unitario)
+    return {
+        'wmape': wmape,
+        'fa': 100 - wmape,
+        'bias_total': np.nansum(df['bias_individual'].to_numpy(dtype='float64')),
+        'mad': np.nanmean(erro_absoluto) if len(erro_absoluto) else 0.0,
+        'prejuizo_total': np.nansum(df['prejuizo'].to_numpy(dtype='float64')),
+        'giro_estoque': valor_vendas_total / valor_estoque_total if valor_estoque_total > 0 else 0,
+        'itens_pedir': int((df['Status_Estoque'] == STATUS_PEDIR).sum()),
+    }
+
+
+# --- PIPELINE COMPLETO ---
+def processar(df, custo_pedido, custo_manutencao_percentual, moq_fornecedor, lote_multiplo,
+              periodos_no_ano, dias_no_periodo, nivel_servico_z):
+    """Executa todas as etapas em sequência sobre um DataFrame já validado."""
+    df, _ = garantir_estoque(df)
+    df = calcular_curva_abc(calcular_acuracia(df))
+    pedido = calcular_pedido(df, custo_pedido, custo_manutencao_percentual, moq_fornecedor, lote_multiplo, periodos_no_ano)
+    rop = calcular_ponto_pedido(df, Z_SCORES[nivel_servico_z], dias_no_periodo)
+    return pd.concat([df, pedido, rop], axis=1)
@@ -0,0 +1,124 @@
+"""Consolidação de resultados por (produto, local) em visões por produto, por local e da rede.
+
+Com a coluna `local`, o motor calcula LEC, SS, ROP e Status_Estoque para cada par (produto, local).
+Aqui esses resultados são somados por produto e por local, e o estoque de segurança é recalculado
+como se a demanda de todos os locais fosse atendida por um único estoque (pooling): com demandas
+independentes, as variâncias se somam e SS_agrupado = √(Σ SS_i²).
+
+As somas são reduções por segmento sobre os códigos da coluna categórica (np.bincount), sem
+montar o groupby do pandas, para escalar a milhões de pares (produto, local).
+"""
+import numpy as np
+import pandas as pd
+
+from estoque import motor
+
+COLUNAS_SOMADAS_PRODUTO = [
+    'real', 'previsto', 'erro_absoluto', 'prejuizo', 'valor_consumo', 'estoque',
+    'estoque_seguranca', 'Ponto_de_Pedido', 'Pedido_Recomendado',
+]
+
+COLUNAS_PRODUTO_PARA_EXIBIR = [
+    'produto', 'Curva_ABC', 'locais', 'locais_pedir', 'real', 'estoque', 'estoque_seguranca',
+    'estoque_seguranca_agrupado', 'reducao_pooling_percentual', 'Ponto_de_Pedido', 'Ponto_de_Pedido_Agrupado',
+    'Pedido_Recomendado', 'Status_Rede',
+]
+
+
+def tem_locais(df):
+    return 'local' in df.columns
+
+
+def rotulo(df):
+    """Nome de exibição de cada linha: 'produto' ou 'produto (local)'."""
+    if not tem_locais(df):
+        return df['produto'].astype(str)
+    return df['produto'].astype(str) + ' (' + df['local'].astype(str) + ')'
+
+
+# --- REDUÇÃO POR GRUPO ---
+def _coluna(df, coluna):
+    return df[coluna].to_numpy(dtype='float64', na_value=0.0)
+
+
+def _somar_por_grupo(df, chave, valores):
+    """Soma cada array de `valores` pelos grupos de `chave` (valores ausentes já chegam como 0).
+
+    Retorna um DataFrame indexado pelos grupos presentes, com as somas e a coluna 'linhas'.
+    """
+    serie = df[chave]
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos, grupos = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codigos, grupos = pd.factorize(serie)
+    validos = codigos >= 0
+    if not validos.all():
+        codigos = codigos[validos]
+        valores = {nome: v[validos] for nome, v in valores.items()}
+
+    linhas = np.bincount(codigos, minlength=len(grupos))
+    presentes = linhas > 0
+    somas = {nome: np.bincount(codigos, weights=v, minlength=len(grupos))[presentes] for nome, v in valores.items()}
+    return pd.DataFrame({**somas, 'linhas': linhas[presentes]}, index=pd.Index(grupos[presentes], name=chave))
+
+
+# --- CONSOLIDAÇÕES ---
+def consolidar_por_produto(df):
+    """Uma linha por produto somando todos os locais, com SS e ROP agrupados e a Curva ABC da rede.
+
+    `estoque_seguranca` é a soma dos SS de cada local; `estoque_seguranca_agrupado` é o SS de um
+    estoque único para a mesma demanda. Status_Rede compara o estoque total com o ROP agrupado.
+    """
+    valores = {coluna: _coluna(df, coluna) for coluna in COLUNAS_SOMADAS_PRODUTO}
+    valor_unitario = _coluna(df, 'valor_unitario')
+    valores['estoque_seguranca_quad'] = valores['estoque_seguranca'] ** 2
+    valores['demanda_lead_time'] = _coluna(df, 'demanda_diaria_media') * _coluna(df, 'lead_time_dias')
+    valores['valor_estoque_seguranca'] = valores['estoque_seguranca'] * valor_unitario
+    valores['soma_valor_unitario'] = valor_unitario
+    valores['locais_pedir'] = (df['Status_Estoque'] == motor.STATUS_PEDIR).to_numpy(dtype='float64')
+    res = _somar_por_grupo(df, 'produto', valores).rename(columns={'linhas': 'locais'})
+
+    res['locais_pedir'] = res['locais_pedir'].astype('int64')
+    res['valor_unitario'] = res.pop('soma_valor_unitario') / res['locais']
+    res['estoque_seguranca_agrupado'] = np.sqrt(res.pop('estoque_seguranca_quad'))
+    res['reducao_pooling'] = res['estoque_seguranca'] - res['estoque_seguranca_agrupado']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        res['reducao_pooling_percentual'] = np.where(
+            res['estoque_seguranca'] > 0, res['reducao_pooling'] / res['estoque_seguranca'] * 100, 0.0)
+    res['Ponto_de_Pedido_Agrupado'] = (res.pop('demanda_lead_time') + res['estoque_seguranca_agrupado']).round(0)
+    res['Status_Rede'] = np.where(res['estoque'] <= res['Ponto_de_Pedido_Agrupado'], motor.STATUS_PEDIR, motor.STATUS_OK)
+
+    # Curva ABC da rede, pelo consumo somado de todos os locais
+    ordenado = res.reset_index().sort_values('valor_consumo', ascending=False, kind='stable')
+    return motor.classificar_curva_abc(ordenado)
+
+
+def consolidar_por_local(df):
+    """Uma linha por local: produtos, valor em estoque, SS (em valor), itens a pedir e prejuízo."""
+    valor_unitario = _coluna(df, 'valor_unitario')
+    valores = {
+        'valor_consumo': _coluna(df, 'valor_consumo'),
+        'valor_estoque': _coluna(df, 'estoque') * valor_unitario,
+        'valor_estoque_seguranca': _coluna(df, 'estoque_seguranca') * valor_unitario,
+        'prejuizo': _coluna(df, 'prejuizo'),
+        'itens_pedir': (df['Status_Estoque'] == motor.STATUS_PEDIR).to_numpy(dtype='float64'),
+    }
+    res = _somar_por_grupo(df, 'local', valores).rename(columns={'linhas': 'produtos'})
+    res['itens_pedir'] = res['itens_pedir'].astype('int64')
+    return res[['produtos', 'valor_consumo', 'valor_estoque', 'valor_estoque_seguranca', 'prejuizo', 'itens_pedir']].reset_index()
+
+
+def indicadores_rede(df_produtos):
+    """Totais da rede a partir da consolidação por produto, com o SS em valor por local e agrupado."""
+    valor_unitario = df_produtos['valor_unitario'].to_numpy(dtype='float64')
+    valor_ss_locais = np.nansum(df_produtos['valor_estoque_seguranca'].to_numpy(dtype='float64'))
+    valor_ss_agrupado = np.nansum(df_produtos['estoque_seguranca_agrupado'].to_numpy(dtype='float64') * valor_unitario)
+    return {
+        'produtos': len(df_produtos),
+        'valor_ss_locais': valor_ss_locais,
+        'valor_ss_agrupado': valor_ss_agrupado,
+        'reducao_pooling_percentual': ((valor_ss_locais - valor_ss_agrupado) / valor_ss_locais * 100
+                                       if valor_ss_locais > 0 else 0.0),
+        'produtos_pedir_rede': int((df_produtos['Status_Rede'] == motor.STATUS_PEDIR).sum()),
+        'produtos_com_local_pedir': int((df_produtos['locais_pedir'] > 0).sum()),
+    }
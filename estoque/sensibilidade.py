@@ -0,0 +1,114 @@
+"""Análise de sensibilidade: grade de nível de serviço × custo de manutenção × custo do pedido.
+
+Em vez de refazer o pipeline para cada combinação, a grade inteira é avaliada de uma vez com
+broadcasting sobre todos os produtos, aproveitando a estrutura das fórmulas:
+
+- o SS é linear em Z: SS = Z · σ_L, com σ_L o desvio da demanda no lead time (SS com Z = 1);
+- o LEC depende apenas de K / H, então o pedido e os custos de ciclo formam uma grade H × K;
+- o status de ressuprimento depende apenas de Z.
+
+Qualquer nível de serviço é aceito: Z vem da inversa da normal acumulada, e não da tabela
+fixa de Z_SCORES.
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from estoque import motor
+
+
+def z_para_nivel(niveis_servico):
+    """Z-score de cada nível de serviço (fração entre 0 e 1, exclusive) pela inversa da normal acumulada."""
+    normal = NormalDist()
+    return np.array([normal.inv_cdf(float(nivel)) for nivel in np.atleast_1d(niveis_servico)])
+
+
+def _custos_de_ciclo(demanda_anual, valor_unitario, moq, lote, custos_manutencao_percentual, custos_pedido):
+    """Custo anual de pedidos e de manutenção do estoque de ciclo, somados nos produtos, na grade H × K."""
+    h = np.asarray(custos_manutencao_percentual, dtype='float64') / 100
+    k = np.asarray(custos_pedido, dtype='float64')
+
+    # LEC = √(2D / v) · √(K / H): a parte por produto é calculada uma vez e escalada pela grade.
+    # Mesmo pedido do motor: LEC arredondado (0 sem valor unitário, infinito com H = 0), MOQ e lote múltiplo.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        base = np.where(valor_unitario > 0, np.sqrt(2 * demanda_anual / valor_unitario), 0.0)
+        razao = np.where(h[:, None] > 0, np.sqrt(k[None, :] / h[:, None]), np.inf)
+        pedido = base[None, None, :] * razao[:, :, None]
+    pedido[np.isnan(pedido)] = 0.0
+    np.round(pedido, out=pedido)
+    np.maximum(pedido, moq, out=pedido)
+    if np.any(lote != 1):
+        np.divide(pedido, lote, out=pedido)
+        np.ceil(pedido, out=pedido)
+        np.multiply(pedido, lote, out=pedido)
+
+    # As somas nos produtos são produtos matriciais: Σ D/Q (pedidos por ano) e Σ Q·v/2 (estoque médio em valor)
+    # (com H = 0 o pedido é infinito: não há custo de manutenção e D/Q = 0)
+    with np.errstate(invalid='ignore'):
+        estoque_medio = np.where(np.isfinite(razao), np.matmul(pedido, valor_unitario / 2), 0.0)
+    np.divide(1.0, pedido, out=pedido, where=pedido > 0)
+    pedidos_por_ano = np.matmul(pedido, demanda_anual)
+    return pedidos_por_ano * k[None, :], estoque_medio * h[:, None]
+
+
+def varrer_parametros(df, niveis_servico, custos_manutencao_percentual, custos_pedido,
+                      moq_fornecedor, lote_multiplo, periodos_no_ano, dias_no_periodo, memoria_mb=256):
+    """Avalia a grade completa de parâmetros sobre os produtos de `df` (colunas de entrada do motor).
+
+    Retorna uma linha por combinação (nível de serviço, custo de manutenção %, custo do pedido) com o
+    capital em estoque de segurança, os custos anuais de pedidos e de manutenção (ciclo + SS), o custo
+    total e a quantidade de itens a pedir. Os produtos são processados em blocos que respeitam
+    `memoria_mb` para as matrizes H × K × produtos.
+    """
+    niveis_servico = np.asarray(niveis_servico, dtype='float64')
+    custos_manutencao_percentual = np.asarray(custos_manutencao_percentual, dtype='float64')
+    custos_pedido = np.asarray(custos_pedido, dtype='float64')
+    z = z_para_nivel(niveis_servico)
+
+    # σ_L e demanda no lead time de cada produto, pela mesma fórmula de SS do motor (SS com Z = 1)
+    base = motor.calcular_ponto_pedido(df, 1.0, dias_no_periodo)
+    sigma = base['estoque_seguranca'].to_numpy(dtype='float64', na_value=0.0)
+    demanda_lead_time = (base['demanda_diaria_media'].to_numpy(dtype='float64', na_value=0.0)
+                         * df['lead_time_dias'].to_numpy(dtype='float64', na_value=0.0))
+    estoque = df['estoque'].to_numpy(dtype='float64', na_value=0.0)
+    valor_unitario = df['valor_unitario'].to_numpy(dtype='float64', na_value=0.0)
+    demanda_anual = df['real'].to_numpy(dtype='float64', na_value=0.0) * periodos_no_ano
+    moq = motor.parametro_por_produto(df, 'moq', moq_fornecedor, minimo=0)
+    lote = motor.parametro_por_produto(df, 'lote_multiplo', lote_multiplo, minimo=1)
+
+    # Capital em SS é linear em Z
+    capital_ss = z * np.sum(sigma * valor_unitario)
+
+    # Itens a pedir (grade Z) e custos de ciclo (grade H × K), em blocos de produtos
+    n_matrizes = len(z) + 4 * len(custos_manutencao_percentual) * len(custos_pedido)
+    tamanho_bloco = max(1, int(memoria_mb * 1024 ** 2 // (n_matrizes * 8)))
+    itens_pedir = np.zeros(len(z), dtype='int64')
+    custo_pedidos = np.zeros((len(custos_manutencao_percentual), len(custos_pedido)))
+    custo_manutencao_ciclo = np.zeros_like(custo_pedidos)
+    for inicio in range(0, len(df), tamanho_bloco):
+        fatia = slice(inicio, inicio + tamanho_bloco)
+        rop = np.round(demanda_lead_time[None, fatia] + z[:, None] * sigma[None, fatia])
+        itens_pedir += (estoque[None, fatia] <= rop).sum(axis=1)
+        pedidos, manutencao = _custos_de_ciclo(demanda_anual[fatia], valor_unitario[fatia], moq[fatia], lote[fatia],
+                                               custos_manutencao_percentual, custos_pedido)
+        custo_pedidos += pedidos
+        custo_manutencao_ciclo += manutencao
+
+    # Grade completa Z × H × K por broadcasting dos resultados parciais
+    forma = (len(z), len(custos_manutencao_percentual), len(custos_pedido))
+    custo_manutencao = (custo_manutencao_ciclo[None, :, :]
+                        + capital_ss[:, None, None] * custos_manutencao_percentual[None, :, None] / 100)
+    custo_pedidos = np.broadcast_to(custo_pedidos[None, :, :], forma)
+    indices = np.indices(forma).reshape(3, -1)
+    return pd.DataFrame({
+        'nivel_servico': niveis_servico[indices[0]],
+        'z_score': z[indices[0]],
+        'custo_manutencao_percentual': custos_manutencao_percentual[indices[1]],
+        'custo_pedido': custos_pedido[indices[2]],
+        'capital_estoque_seguranca': capital_ss[indices[0]],
+        'custo_pedidos_anual': custo_pedidos.ravel(),
+        'custo_manutencao_anual': custo_manutencao.ravel(),
+        'custo_total_anual': (custo_pedidos + custo_manutencao).ravel(),
+        'itens_pedir': itens_pedir[indices[0]],
+    })
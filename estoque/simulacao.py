@@ -0,0 +1,139 @@
+"""Simulação de Monte Carlo do nível de serviço obtido pelo Ponto de Pedido.
+
+Para cada produto, sorteia o lead time e a demanda durante o lead time a partir das estatísticas
+do CSV (ou das calculadas do histórico diário) e estima a probabilidade de ruptura por ciclo, o
+fill rate e o ROP necessário para atingir uma meta de serviço qualquer. Os sorteios são feitos
+em matrizes produtos × simulações, em blocos de produtos que respeitam um limite de memória.
+
+Lead time e demanda seguem distribuições gama (contínuas e assimétricas, adequadas a itens de
+demanda intermitente): a demanda de L dias é Gama(L·k, θ), com k = μ²/σ² e θ = σ²/μ da demanda diária.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+TIPOS_META = ('ciclo', 'fill_rate')
+
+# Bytes por produto e simulação no pico de cada meta: no sorteio da demanda, até seis matrizes
+# float32 vivas; no fill rate, a amostra float32, quatro float64 (soma do sufixo, sufixo posterior,
+# restantes × demanda e falta esperada) e a comparação booleana
+_BYTES_POR_SIMULACAO = {'ciclo': 6 * 4, 'fill_rate': 4 + 4 * 8 + 1}
+
+# Memória máxima de um bloco; o tamanho do bloco (e as sementes de cada um) não depende do número de
+# threads, para que a mesma semente dê o mesmo resultado em qualquer máquina
+_MEMORIA_BLOCO_MB = 32
+
+
+def estatisticas_por_produto(df):
+    """Extrai (μd, σd, LT, σLT) por produto. Sem σd, usa σd = μd, como a fórmula simplificada de SS."""
+    mu = df['demanda_diaria_media'].to_numpy(dtype='float64')
+    lt = df['lead_time_dias'].to_numpy(dtype='float64')
+    if 'desvio_padrao_demanda_diaria' in df.columns:
+        sd = df['desvio_padrao_demanda_diaria'].to_numpy(dtype='float64', na_value=np.nan)
+    else:
+        sd = mu.copy()
+    if 'desvio_padrao_lead_time' in df.columns:
+        sd_lt = df['desvio_padrao_lead_time'].to_numpy(dtype='float64', na_value=np.nan)
+    else:
+        sd_lt = np.zeros_like(lt)
+    return (np.nan_to_num(mu), np.nan_to_num(sd), np.nan_to_num(lt), np.nan_to_num(sd_lt))
+
+
+def _amostrar_gama(rng, media, desvio, n):
+    """Amostras (produtos × n) de uma gama com a média e o desvio dados; desvio 0 repete a média."""
+    aleatoria = (media > 0) & (desvio > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        forma = np.where(aleatoria, (media / desvio) ** 2, 1.0)
+        escala = np.where(aleatoria, desvio ** 2 / media, 0.0)
+    amostras = rng.standard_gamma(np.broadcast_to(forma[:, None], (len(media), n)).astype('float32'), dtype=np.float32)
+    return np.where(aleatoria[:, None], amostras * escala[:, None].astype('float32'), media[:, None].astype('float32'))
+
+
+def _simular_bloco(mu, sd, lt, sd_lt, rop, pedido, meta, tipo_meta, n_simulacoes, semente):
+    rng = np.random.default_rng(semente)
+    m = len(mu)
+
+    # Lead time por simulação e demanda acumulada nesse lead time
+    lead_time = _amostrar_gama(rng, lt, sd_lt, n_simulacoes)
+    aleatoria = (mu > 0) & (sd > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = np.where(aleatoria, (mu / sd) ** 2, 1.0).astype('float32')
+        theta = np.where(aleatoria, sd ** 2 / mu, 0.0).astype('float32')
+    forma = lead_time * k[:, None]
+    demanda = rng.standard_gamma(np.where(aleatoria[:, None], forma, 1.0), dtype=np.float32)
+    demanda = np.where(aleatoria[:, None], demanda * theta[:, None], lead_time * mu[:, None].astype('float32'))
+    del lead_time, forma
+
+    # Desempenho do ROP atual
+    falta = np.maximum(demanda - rop[:, None].astype('float32'), 0)
+    prob_ruptura = (falta > 0).mean(axis=1)
+    falta_media = falta.mean(axis=1, dtype='float64')
+    del falta
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fill_rate = np.clip(1 - np.where(np.isinf(pedido), 0.0, falta_media / pedido), 0, 1)
+
+    # ROP para a meta, a partir das amostras ordenadas
+    demanda.sort(axis=1)
+    if tipo_meta == 'ciclo':
+        indice = max(int(np.ceil(meta * n_simulacoes)) - 1, 0)
+        rop_meta = demanda[:, indice].astype('float64')
+    else:
+        # Falta esperada por ciclo com ROP = x_k: Σ_{j>k} (x_j - x_k) / n, decrescente em k
+        acumulado_sufixo = np.cumsum(demanda[:, ::-1], axis=1, dtype='float64')[:, ::-1]
+        restantes = np.arange(n_simulacoes - 1, -1, -1, dtype='float64')
+        sufixo_posterior = np.concatenate([acumulado_sufixo[:, 1:], np.zeros((m, 1))], axis=1)
+        falta_esperada = (sufixo_posterior - restantes * demanda) / n_simulacoes
+        del acumulado_sufixo, sufixo_posterior
+        tolerada = np.where(np.isinf(pedido), np.inf, (1 - meta) * pedido)
+        indice = np.argmax(falta_esperada <= tolerada[:, None], axis=1)
+        rop_meta = demanda[np.arange(m), indice].astype('float64')
+
+    return prob_ruptura, fill_rate, np.ceil(np.maximum(rop_meta, 0))
+
+
+def simular_nivel_servico(df, meta_servico=0.95, tipo_meta='ciclo', n_simulacoes=10_000,
+                          memoria_mb=256, semente=None, n_threads=None):
+    """Simula o desempenho do Ponto_de_Pedido de cada produto e o ROP que atinge `meta_servico`.
+
+    `tipo_meta` define a meta: 'ciclo' (probabilidade de não romper no ciclo) ou 'fill_rate'
+    (fração da demanda atendida do estoque, usando Pedido_Recomendado como tamanho do ciclo).
+    Os blocos de produtos são processados em threads; o NumPy libera o GIL nos sorteios e na ordenação.
+    Com `semente`, o resultado é reprodutível para os mesmos `n_simulacoes` e `memoria_mb`,
+    qualquer que seja `n_threads`.
+    """
+    if tipo_meta not in TIPOS_META:
+        raise ValueError(f"tipo_meta deve ser um de {TIPOS_META}")
+    mu, sd, lt, sd_lt = estatisticas_por_produto(df)
+    rop = df['Ponto_de_Pedido'].to_numpy(dtype='float64')
+    pedido = df['Pedido_Recomendado'].to_numpy(dtype='float64')
+
+    # Blocos de tamanho fixo (não dependem das threads); o orçamento só limita quantos rodam ao mesmo tempo
+    memoria_bloco = min(memoria_mb, _MEMORIA_BLOCO_MB) * 1024 ** 2
+    tamanho_bloco = max(1, int(memoria_bloco // (n_simulacoes * _BYTES_POR_SIMULACAO[tipo_meta])))
+    blocos_simultaneos = max(1, int(memoria_mb // min(memoria_mb, _MEMORIA_BLOCO_MB)))
+    n_threads = min(n_threads or os.cpu_count() or 1, blocos_simultaneos)
+    inicios = range(0, len(df), tamanho_bloco)
+    sementes = np.random.SeedSequence(semente).spawn(len(inicios))
+
+    def executar(args):
+        inicio, semente_bloco = args
+        fatia = slice(inicio, inicio + tamanho_bloco)
+        return _simular_bloco(mu[fatia], sd[fatia], lt[fatia], sd_lt[fatia], rop[fatia], pedido[fatia],
+                              meta_servico, tipo_meta, n_simulacoes, semente_bloco)
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        resultados = list(executor.map(executar, zip(inicios, sementes)))
+
+    if resultados:
+        prob_ruptura, fill_rate, rop_meta = (np.concatenate(partes) for partes in zip(*resultados))
+    else:
+        prob_ruptura = fill_rate = rop_meta = np.array([], dtype='float64')
+    return pd.DataFrame({
+        'prob_ruptura_simulada': prob_ruptura,
+        'nivel_servico_simulado': 1 - prob_ruptura,
+        'fill_rate_simulado': fill_rate,
+        'ROP_Simulado': rop_meta,
+    }, index=df.index)
@@ -0,0 +1,74 @@
+"""Tabela detalhada paginada no servidor e exportação completa em blocos.
+
+Filtros e ordenação trabalham sobre posições (arrays de inteiros) do resultado em cache; só as
+linhas da página visível são copiadas e enviadas ao navegador.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from estoque import motor
+
+
+TAMANHO_BLOCO_EXPORTACAO = 100_000
+
+
+def filtrar_posicoes(df, classes=None, status=None, busca=''):
+    """Posições das linhas que passam nos filtros de Curva_ABC, Status_Estoque e trecho do produto.
+
+    Os filtros são os mesmos de `motor.mascara_selecao`, usada pelos indicadores e gráficos.
+    """
+    mascara = motor.mascara_selecao(df, classes, status)
+    if busca:
+        mascara &= motor.mascara_texto(df['produto'], busca, contem=True)
+    return np.flatnonzero(mascara)
+
+
+def ordenar_posicoes(df, posicoes, coluna, ascendente=True):
+    """Reordena `posicoes` pelos valores de `coluna` (valores ausentes sempre no fim)."""
+    serie = df[coluna]
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # As categorias são ordenadas na leitura, então os códigos seguem a ordem alfabética
+        valores = serie.cat.codes.to_numpy()[posicoes].astype('float64')
+        valores[valores < 0] = np.nan
+    elif pd.api.types.is_numeric_dtype(serie.dtype):
+        valores = serie.to_numpy(dtype='float64', na_value=np.nan)[posicoes]
+    else:
+        valores = pd.factorize(serie.iloc[posicoes], sort=True)[0].astype('float64')
+        valores[valores < 0] = np.nan
+
+    if not ascendente:
+        valores = -valores
+    return posicoes[np.argsort(valores, kind='stable')]
+
+
+def pagina(df, posicoes, numero_pagina, tamanho_pagina, colunas=None):
+    """Linhas da página `numero_pagina` (a partir de 1). Apenas essas linhas são copiadas."""
+    inicio = (numero_pagina - 1) * tamanho_pagina
+    selecionadas = posicoes[inicio:inicio + tamanho_pagina]
+    resultado = df.iloc[selecionadas]
+    return resultado[colunas] if colunas is not None else resultado
+
+
+def total_paginas(n_linhas, tamanho_pagina):
+    return max(1, -(-n_linhas // tamanho_pagina))
+
+
+def exportar_csv(df, colunas, posicoes=None, tamanho_bloco=TAMANHO_BLOCO_EXPORTACAO):
+    """Monta o CSV do resultado bloco a bloco e o devolve num BytesIO, pronto para o download.
+
+    Apenas um bloco de linhas é convertido em texto por vez, então não há uma cópia em texto da
+    tabela inteira além do CSV final (que o download do Streamlit lê inteiro de qualquer forma).
+    Sem arquivo temporário, não sobra arquivo aberto para fechar.
+    """
+    destino = io.BytesIO()
+    n_linhas = len(df) if posicoes is None else len(posicoes)
+    for inicio in range(0, max(n_linhas, 1), tamanho_bloco):
+        if posicoes is None:
+            bloco = df.iloc[inicio:inicio + tamanho_bloco][colunas]
+        else:
+            bloco = df.iloc[posicoes[inicio:inicio + tamanho_bloco]][colunas]
+        destino.write(bloco.to_csv(index=False, header=(inicio == 0)).encode('utf-8'))
+    destino.seek(0)
+    return destino